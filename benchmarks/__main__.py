@@ -0,0 +1,313 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+import html_to_exe
+from benchmarks.sitegen import presets, generate_site
+from benchmarks.startup import (measure_startup, summarize_startup, print_startup_summary, compare_profiles,
+                                print_profile_comparison)
+from benchmarks.importtime import default_budget_ms, check_import_budget
+
+default_results_dir = os.path.join(repo_dir, 'benchmarks', 'results')
+
+def git_revision():
+    # Short commit id of the tree being measured, marked when it has local changes
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_dir, check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+        changes = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=repo_dir,
+                                 check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ('-dirty' if changes else '')
+
+def parse_option(text):
+    # KEY=VALUE for BuildConfig; values are read as JSON when possible (4, true, "page")
+    key, _, value = text.partition('=')
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+def run_build(site_dir, out_dir, cache_dir, options, executable, verbose):
+    config = html_to_exe.BuildConfig(site_dir, out_dir, cache_dir=os.path.join(cache_dir, 'build'),
+                                     artifact_cache_dir=os.path.join(cache_dir, 'artifacts'), **options)
+    builder = html_to_exe.Builder(config)
+    output = contextlib.ExitStack()
+    if not verbose:
+        output.enter_context(contextlib.redirect_stdout(io.StringIO()))
+    started = time.perf_counter()
+    with output:
+        if executable:
+            builder.run()
+        else:
+            builder.process_files()
+            builder.cleanup()
+    return {'wall_seconds': round(time.perf_counter() - started, 4), 'stages': builder.report.stages}
+
+def summarize(runs):
+    # Median time per stage over all runs, with throughput from the stage's files and bytes
+    summary = {'wall_seconds': statistics.median(run['wall_seconds'] for run in runs), 'stages': {}}
+    names = list(dict.fromkeys(stage['name'] for run in runs for stage in run['stages']))
+    for name in names:
+        records = [stage for run in runs for stage in run['stages'] if stage['name'] == name]
+        wall = statistics.median(record['wall_seconds'] for record in records)
+        files = records[0]['files']
+        size = records[0]['bytes']
+        summary['stages'][name] = {
+            'wall_seconds': wall,
+            'cpu_seconds': statistics.median(record['cpu_seconds'] for record in records),
+            'files': files,
+            'bytes': size,
+            'files_per_second': round(files / wall, 1) if wall else None,
+            'mb_per_second': round(size / (1024 * 1024) / wall, 2) if wall else None,
+        }
+    return summary
+
+def print_summary(summary):
+    print(f"{'stage':<24}{'wall s':>10}{'cpu s':>10}{'files':>8}{'MB':>10}{'files/s':>12}{'MB/s':>10}")
+    for name, stage in summary['stages'].items():
+        print(f"{name:<24}{stage['wall_seconds']:>10.3f}{stage['cpu_seconds']:>10.3f}{stage['files']:>8}"
+              f"{stage['bytes'] / (1024 * 1024):>10.2f}{stage['files_per_second'] or 0:>12.1f}"
+              f"{stage['mb_per_second'] or 0:>10.2f}")
+    print(f"{'total':<24}{summary['wall_seconds']:>10.3f}")
+
+def command_run(args):
+    shape = dict(presets[args.preset])
+    for key in shape:
+        if getattr(args, key) is not None:
+            shape[key] = getattr(args, key)
+    options = dict(parse_option(option) for option in args.option)
+
+    root = tempfile.mkdtemp(prefix='html_to_exe_bench_')
+    try:
+        site_dir = os.path.join(root, 'site')
+        written = generate_site(site_dir, seed=args.seed, **shape)
+        print(f"Generated {written['files']} files ({written['bytes'] / (1024 * 1024):.1f} MB) in {site_dir}")
+
+        shared_cache = os.path.join(root, 'cache')
+        if args.warm:
+            # Fill the build cache once so the measured runs only see cache hits
+            run_build(site_dir, os.path.join(root, 'out-warmup'), shared_cache, options, args.executable, args.verbose)
+
+        runs = []
+        for index in range(args.repeat):
+            cache_dir = shared_cache if args.warm else os.path.join(root, f'cache-{index}')
+            run = run_build(site_dir, os.path.join(root, f'out-{index}'), cache_dir, options, args.executable, args.verbose)
+            print(f"Run {index + 1}/{args.repeat}: {run['wall_seconds']:.3f}s")
+            runs.append(run)
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    summary = summarize(runs)
+    print_summary(summary)
+
+    revision = git_revision()
+    result = {
+        'revision': revision,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'preset': args.preset,
+        'shape': shape,
+        'seed': args.seed,
+        'options': options,
+        'executable': args.executable,
+        'warm_cache': args.warm,
+        'cpu_count': os.cpu_count(),
+        'toolchain': html_to_exe.toolchain_versions(),
+        'summary': summary,
+        'runs': runs,
+    }
+    os.makedirs(args.results, exist_ok=True)
+    result_path = os.path.join(args.results, f"{datetime.now():%Y%m%d-%H%M%S}-{revision}-{args.preset}.json")
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {result_path}")
+    return 0
+
+def command_compare(args):
+    with open(args.old, encoding='utf-8') as f:
+        old = json.load(f)
+    with open(args.new, encoding='utf-8') as f:
+        new = json.load(f)
+    if old['shape'] != new['shape'] or old['options'] != new['options']:
+        print("Warning: the results were measured with different site shapes or options")
+    print(f"{'stage':<24}{old['revision']:>16}{new['revision']:>16}{'change':>10}")
+    old_stages = old['summary']['stages']
+    new_stages = new['summary']['stages']
+    rows = [(name, old_stages.get(name), new_stages.get(name))
+            for name in dict.fromkeys(list(old_stages) + list(new_stages))]
+    rows.append(('total', old['summary'], new['summary']))
+    for name, before, after in rows:
+        before_time = before['wall_seconds'] if before else None
+        after_time = after['wall_seconds'] if after else None
+        change = f"{(after_time - before_time) / before_time * 100:+.1f}%" if before_time and after_time is not None else ''
+        print(f"{name:<24}{'' if before_time is None else f'{before_time:.3f}s':>16}"
+              f"{'' if after_time is None else f'{after_time:.3f}s':>16}{change:>10}")
+    return 0
+
+def command_generate(args):
+    shape = dict(presets[args.preset])
+    for key in shape:
+        if getattr(args, key) is not None:
+            shape[key] = getattr(args, key)
+    written = generate_site(args.dest, seed=args.seed, **shape)
+    print(f"Generated {written['files']} files ({written['bytes'] / (1024 * 1024):.1f} MB) in {args.dest}")
+    return 0
+
+def command_startup(args):
+    env = dict(parse_env(item) for item in args.env)
+    traces = measure_startup(args.executable, args.runs, args.timeout, not args.no_xvfb, args.cold, env, args.verbose)
+    summary = summarize_startup(traces)
+    print_startup_summary(summary)
+    if not traces:
+        return 1
+
+    revision = git_revision()
+    result = {
+        'revision': revision,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'executable': os.path.abspath(args.executable),
+        'executable_bytes': os.path.getsize(args.executable),
+        'cold': args.cold,
+        'env': env,
+        'summary': summary,
+        'traces': traces,
+    }
+    os.makedirs(args.results, exist_ok=True)
+    result_path = os.path.join(args.results, f"{datetime.now():%Y%m%d-%H%M%S}-{revision}-startup.json")
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {result_path}")
+    return 0
+
+def build_sample_app(root, preset, seed, verbose):
+    # Instant build of a generated site; the runner stub and the executable
+    # come from the usual caches when they are already there
+    site_dir = os.path.join(root, 'site')
+    generate_site(site_dir, seed=seed, **presets[preset])
+    builder = html_to_exe.Builder(html_to_exe.BuildConfig(site_dir, os.path.join(root, 'out'), instant=True))
+    output = contextlib.ExitStack()
+    if not verbose:
+        output.enter_context(contextlib.redirect_stdout(io.StringIO()))
+    with output:
+        builder.run()
+    return builder.executable_path
+
+def command_profiles(args):
+    root = tempfile.mkdtemp(prefix='html_to_exe_profiles_')
+    try:
+        executable = args.executable
+        if executable is None:
+            print(f"Building the {args.preset} sample site")
+            executable = build_sample_app(root, args.preset, args.seed, args.verbose)
+        results = compare_profiles(executable, args.profile or ['default', 'low-memory'], args.runs, args.timeout,
+                                   not args.no_xvfb, args.settle, args.verbose)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    print_profile_comparison(results)
+    if not all(summary['runs'] for summary in results.values()):
+        return 1
+
+    revision = git_revision()
+    result = {
+        'revision': revision,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'executable': os.path.abspath(args.executable) if args.executable else None,
+        'preset': None if args.executable else args.preset,
+        'settle_seconds': args.settle,
+        'profiles': results,
+    }
+    os.makedirs(args.results, exist_ok=True)
+    result_path = os.path.join(args.results, f"{datetime.now():%Y%m%d-%H%M%S}-{revision}-profiles.json")
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {result_path}")
+    return 0
+
+def command_importtime(args):
+    return 0 if check_import_budget(repo_dir, args.runs, args.budget_ms) else 1
+
+def parse_env(text):
+    key, _, value = text.partition('=')
+    return key, value
+
+def build_arg_parser():
+    shape = argparse.ArgumentParser(add_help=False)
+    shape.add_argument('--preset', choices=sorted(presets), default='small', help="site shape to start from")
+    shape.add_argument('--pages', type=int, help="number of HTML pages")
+    shape.add_argument('--css-files', type=int, help="number of CSS files")
+    shape.add_argument('--css-kb', type=int, help="size of each CSS file in KB")
+    shape.add_argument('--js-files', type=int, help="number of JavaScript files")
+    shape.add_argument('--js-kb', type=int, help="size of each JavaScript file in KB")
+    shape.add_argument('--asset-files', type=int, help="number of binary assets")
+    shape.add_argument('--asset-mb', type=int, help="total size of the binary assets in MB")
+    shape.add_argument('--depth', type=int, help="maximum folder depth")
+    shape.add_argument('--seed', type=int, default=0, help="random seed for the generated content")
+
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description="Benchmark the HTML to EXE build pipeline")
+    commands = parser.add_subparsers(dest='command')
+
+    run = commands.add_parser('run', parents=[shape], help="generate a site, build it and record stage timings")
+    run.add_argument('--repeat', type=int, default=3, help="number of measured builds")
+    run.add_argument('--warm', action='store_true', help="measure with filled build and artifact caches instead of empty ones")
+    run.add_argument('--executable', action='store_true', help="also run create_executable() (PyInstaller or --option instant=true)")
+    run.add_argument('--option', action='append', default=[], help="BuildConfig option as KEY=VALUE, e.g. bundle_mode=page (repeatable)")
+    run.add_argument('--results', default=default_results_dir, help="folder for the results JSON")
+    run.add_argument('--keep', action='store_true', help="keep the generated site and build output")
+    run.add_argument('--verbose', action='store_true', help="show the build output")
+
+    compare = commands.add_parser('compare', help="compare two results files stage by stage")
+    compare.add_argument('old')
+    compare.add_argument('new')
+
+    startup = commands.add_parser('startup', help="launch a built app repeatedly and report startup latency and memory")
+    startup.add_argument('executable', help="executable built by html_to_exe")
+    startup.add_argument('--runs', type=int, default=10, help="number of launches")
+    startup.add_argument('--timeout', type=float, default=60, help="seconds to wait for index.html to load")
+    startup.add_argument('--cold', action='store_true', help="remove unpacked instant-build payloads before each launch")
+    startup.add_argument('--no-xvfb', action='store_true', help="do not wrap the app in xvfb-run when there is no display")
+    startup.add_argument('--env', action='append', default=[], help="extra environment variable for the app as KEY=VALUE (repeatable)")
+    startup.add_argument('--results', default=default_results_dir, help="folder for the results JSON")
+    startup.add_argument('--verbose', action='store_true', help="show the app's output")
+
+    profiles = commands.add_parser('profiles', help="compare the memory and startup time of the app's runtime profiles")
+    profiles.add_argument('executable', nargs='?', help="executable built by html_to_exe (default: an instant build of a generated site)")
+    profiles.add_argument('--profile', action='append', choices=['default', 'low-memory'], help="runtime profile to measure (repeatable, default: all)")
+    profiles.add_argument('--preset', choices=sorted(presets), default='small', help="site shape to build when no executable is given")
+    profiles.add_argument('--seed', type=int, default=0, help="random seed for the generated site")
+    profiles.add_argument('--runs', type=int, default=5, help="number of launches per profile")
+    profiles.add_argument('--settle', type=float, default=2, help="seconds to keep the app open after the load")
+    profiles.add_argument('--timeout', type=float, default=60, help="seconds to wait for index.html to load")
+    profiles.add_argument('--no-xvfb', action='store_true', help="do not wrap the app in xvfb-run when there is no display")
+    profiles.add_argument('--results', default=default_results_dir, help="folder for the results JSON")
+    profiles.add_argument('--verbose', action='store_true', help="show the build and app output")
+
+    importtime = commands.add_parser('importtime', help="check that importing html_to_exe stays fast and loads no heavy modules")
+    importtime.add_argument('--runs', type=int, default=5, help="number of fresh interpreters to measure")
+    importtime.add_argument('--budget-ms', type=float, default=default_budget_ms, help="allowed median import time in milliseconds")
+
+    generate = commands.add_parser('generate', parents=[shape], help="only write a synthetic site")
+    generate.add_argument('dest', help="folder to write the site to")
+    return parser
+
+if __name__ == "__main__":
+    args = build_arg_parser().parse_args()
+    commands = {'run': command_run, 'compare': command_compare, 'startup': command_startup,
+                'profiles': command_profiles, 'importtime': command_importtime, 'generate': command_generate}
+    if args.command not in commands:
+        build_arg_parser().print_help()
+        sys.exit(2)
+    sys.exit(commands[args.command](args))
@@ -0,0 +1,61 @@
+import re
+import statistics
+import subprocess
+import sys
+
+# Modules that only the GUI or a particular build stage needs; importing
+# html_to_exe must not pull any of them in
+heavy_modules = ['PyInstaller', 'PyQt5.QtWidgets', 'PyQt5.QtGui', 'PyQt5.QtWebEngineWidgets',
+                 'PyQt5.QtWebEngineCore', 'bs4', 'lxml', 'csscompressor', 'jsmin']
+default_budget_ms = 200
+
+importtime_re = re.compile(r'^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|( *)(\S+)\s*$')
+
+def parse_importtime(output):
+    # (depth, module, self us, cumulative us) per line of -X importtime output,
+    # in the order Python prints them: each module after its own imports
+    entries = []
+    for line in output.splitlines():
+        match = importtime_re.match(line)
+        if match:
+            depth = (len(match.group(3)) - 1) // 2
+            entries.append((depth, match.group(4), int(match.group(1)), int(match.group(2))))
+    return entries
+
+def measure_import(repo_dir, module='html_to_exe'):
+    # Import module in a fresh interpreter; returns its entries and the cumulative time of module
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=repo_dir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    entries = parse_importtime(result.stderr)
+    index = max(i for i, entry in enumerate(entries) if entry[0] == 0 and entry[1] == module)
+    # The module's direct imports are the depth-1 lines since the previous top-level line
+    start = max([i for i, entry in enumerate(entries[:index]) if entry[0] == 0], default=-1) + 1
+    direct = [entry for entry in entries[start:index] if entry[0] == 1]
+    return entries, entries[index][3], direct
+
+def check_import_budget(repo_dir, runs=5, budget_ms=default_budget_ms, module='html_to_exe'):
+    # Median import time over runs against budget_ms, plus the heavy modules
+    # the import loads. Returns True when both checks pass.
+    totals = []
+    for _ in range(runs):
+        entries, total, direct = measure_import(repo_dir, module)
+        totals.append(total / 1000)
+    median = statistics.median(totals)
+    loaded = sorted({name for _, name, _, _ in entries
+                     if any(name == heavy or name.startswith(heavy + '.') for heavy in heavy_modules)})
+
+    print(f"import {module}: {median:.1f} ms median over {runs} runs (budget {budget_ms} ms)")
+    print("Slowest direct imports (last run):")
+    for _, name, _, cumulative in sorted(direct, key=lambda entry: entry[3], reverse=True)[:10]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    ok = True
+    if loaded:
+        print("Heavy modules imported at module level: " + ", ".join(loaded))
+        ok = False
+    if median > budget_ms:
+        print(f"Import time over budget by {median - budget_ms:.1f} ms")
+        ok = False
+    print("OK" if ok else "FAILED")
+    return ok
@@ -0,0 +1,105 @@
+import os
+import random
+
+# Site shapes used by the benchmark runner; any value can be overridden on the command line
+presets = {
+    'small': {'pages': 20, 'css_files': 5, 'css_kb': 8, 'js_files': 5, 'js_kb': 8,
+              'asset_files': 20, 'asset_mb': 2, 'depth': 2},
+    'medium': {'pages': 200, 'css_files': 40, 'css_kb': 24, 'js_files': 40, 'js_kb': 24,
+               'asset_files': 300, 'asset_mb': 50, 'depth': 3},
+    'large': {'pages': 2000, 'css_files': 200, 'css_kb': 40, 'js_files': 200, 'js_kb': 40,
+              'asset_files': 3000, 'asset_mb': 400, 'depth': 4},
+}
+
+words = ['alpha', 'beta', 'gamma', 'delta', 'card', 'nav', 'menu', 'item', 'title', 'panel',
+         'button', 'grid', 'row', 'col', 'hero', 'footer', 'header', 'list', 'link', 'badge']
+
+def random_dir(rng, depth):
+    # A folder path between zero and depth levels below the site root
+    levels = rng.randrange(depth + 1) if depth > 0 else 0
+    return os.path.join('', *[f"d{rng.randrange(4)}" for _ in range(levels)])
+
+def class_name(rng):
+    return f"{rng.choice(words)}-{rng.randrange(500)}"
+
+def css_text(rng, size):
+    parts = []
+    length = 0
+    while length < size:
+        rule = (f"/* {rng.choice(words)} styles */\n.{class_name(rng)} .{class_name(rng)}, "
+                f"#{class_name(rng)} > {rng.choice(['div', 'span', 'p', 'a', 'li'])} {{\n"
+                f"    margin: {rng.randrange(40)}px {rng.randrange(40)}px;\n"
+                f"    color: #{rng.randrange(0x1000000):06x};\n"
+                f"    background: url(\"../img/bg{rng.randrange(10)}.png\");\n}}\n\n")
+        parts.append(rule)
+        length += len(rule)
+    return ''.join(parts)
+
+def js_text(rng, size):
+    parts = []
+    length = 0
+    while length < size:
+        name = f"{rng.choice(words)}{rng.randrange(100000)}"
+        function = (f"// {rng.choice(words)} handler\nfunction {name}(element, options) {{\n"
+                    f"    var value = options.{rng.choice(words)} || {rng.randrange(1000)};\n"
+                    f"    if (element) {{\n        element.classList.add('{class_name(rng)}');\n    }}\n"
+                    f"    return value * {rng.randrange(100)};\n}}\n\n")
+        parts.append(function)
+        length += len(function)
+    return ''.join(parts)
+
+def html_text(rng, title, css_paths, js_paths, image_paths):
+    head = [f"<title>{title}</title>"]
+    head += [f'<link rel="stylesheet" href="{path}">' for path in css_paths]
+    head += [f'<script src="{path}"></script>' for path in js_paths]
+    body = []
+    for _ in range(rng.randrange(20, 60)):
+        body.append(f'<div class="{class_name(rng)} {class_name(rng)}"><p>{" ".join(rng.choice(words) for _ in range(30))}</p></div>')
+    body += [f'<img src="{path}" alt="">' for path in image_paths]
+    return ("<!DOCTYPE html>\n<html>\n<head>\n" + "\n".join(head) + "\n</head>\n<body>\n"
+            + "\n".join(body) + "\n</body>\n</html>\n")
+
+def generate_site(root, pages, css_files, css_kb, js_files, js_kb, asset_files, asset_mb, depth, seed=0):
+    # Write a deterministic synthetic site under root and return its shape.
+    # Pages link a random subset of the stylesheets, scripts and images using
+    # paths relative to their own folder.
+    rng = random.Random(seed)
+    written = {'files': 0, 'bytes': 0}
+
+    def write(rel_path, data):
+        path = os.path.join(root, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        written['files'] += 1
+        written['bytes'] += len(data)
+
+    css_paths = [os.path.join('css', random_dir(rng, depth - 1), f"style{i}.css") for i in range(css_files)]
+    for path in css_paths:
+        write(path, css_text(rng, css_kb * 1024).encode('utf-8'))
+    js_paths = [os.path.join('js', random_dir(rng, depth - 1), f"script{i}.js") for i in range(js_files)]
+    for path in js_paths:
+        write(path, js_text(rng, js_kb * 1024).encode('utf-8'))
+
+    # Binary assets of varying size adding up to about asset_mb
+    asset_paths = []
+    total = asset_mb * 1024 * 1024
+    for i in range(asset_files):
+        size = max(1, int(total / asset_files * rng.uniform(0.2, 1.8)))
+        extension = rng.choice(['.png', '.jpg', '.woff2', '.mp3', '.bin'])
+        path = os.path.join('img', random_dir(rng, depth - 1), f"asset{i}{extension}")
+        write(path, rng.getrandbits(size * 8).to_bytes(size, 'little'))
+        asset_paths.append(path)
+
+    for i in range(pages):
+        page_path = 'index.html' if i == 0 else os.path.join(random_dir(rng, depth), f"page{i}.html")
+        page_dir = os.path.dirname(page_path)
+
+        def relative(paths, count):
+            chosen = rng.sample(paths, min(count, len(paths)))
+            return [os.path.relpath(path, page_dir or '.').replace(os.sep, '/') for path in chosen]
+
+        html = html_text(rng, f"Page {i}", relative(css_paths, rng.randrange(1, 6)),
+                         relative(js_paths, rng.randrange(1, 6)), relative(asset_paths, rng.randrange(0, 8)))
+        write(page_path, html.encode('utf-8'))
+    return written
@@ -0,0 +1,153 @@
+import glob
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+def percentile(values, fraction):
+    # Nearest-rank percentile of a non-empty list (rounded first so 0.07 * 100
+    # is not taken for slightly more than 7)
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(round(fraction * len(ordered), 9)) - 1))]
+
+def tree_rss(pid):
+    # Resident memory of a process and all its descendants (the QtWebEngine
+    # renderer and GPU processes), Linux only
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return total
+
+def payload_cache_dir():
+    # Where instant builds unpack zip payloads (user_cache_dir() in the runner)
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'html_to_exe')
+
+def launch_command(executable, use_xvfb):
+    # Run under a virtual X server when there is no display to show the window on
+    if use_xvfb and sys.platform.startswith('linux') and not os.environ.get('DISPLAY'):
+        if shutil.which('xvfb-run') is None:
+            raise RuntimeError("xvfb-run not found; install xvfb or pass --no-xvfb")
+        return ['xvfb-run', '-a', executable]
+    return [executable]
+
+def measure_startup(executable, runs=10, timeout=60, use_xvfb=True, cold=False, env=None, verbose=False, settle=0):
+    # Launch the app runs times with startup tracing on and collect one trace
+    # per run. With settle the app stays open that many seconds after the
+    # load, so the peak memory includes the renderer settling down.
+    executable = os.path.abspath(executable)
+    command = launch_command(executable, use_xvfb)
+    traces = []
+    for index in range(runs):
+        if cold:
+            # Instant builds unpack zip payloads once into the user's cache folder
+            for folder in glob.glob(os.path.join(payload_cache_dir(), 'webapp-*')):
+                shutil.rmtree(folder, ignore_errors=True)
+        trace_fd, trace_path = tempfile.mkstemp(suffix='.jsonl', prefix='startup_trace_')
+        os.close(trace_fd)
+        run_env = dict(os.environ, **(env or {}))
+        run_env.update({'WEBAPP_STARTUP_TRACE': trace_path, 'WEBAPP_EXIT_AFTER_LOAD': '1',
+                        'WEBAPP_EXIT_DELAY': str(settle)})
+        output = None if verbose else subprocess.DEVNULL
+        run_env['WEBAPP_TRACE_LAUNCH'] = repr(time.time())
+        process = subprocess.Popen(command, env=run_env, stdout=output, stderr=output)
+
+        # Sample the memory of the whole process tree until the app exits
+        peak_tree_rss = 0
+        deadline = time.time() + timeout + settle
+        while process.poll() is None and time.time() < deadline:
+            if sys.platform.startswith('linux'):
+                peak_tree_rss = max(peak_tree_rss, tree_rss(process.pid))
+            time.sleep(0.05)
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+            print(f"Run {index + 1}/{runs}: no load within {timeout}s")
+            os.remove(trace_path)
+            continue
+
+        with open(trace_path, encoding='utf-8') as f:
+            lines = [line for line in f if line.strip()]
+        os.remove(trace_path)
+        if not lines:
+            print(f"Run {index + 1}/{runs}: exited with code {process.returncode} without a trace")
+            continue
+        trace = json.loads(lines[-1])
+        trace['peak_tree_rss_bytes'] = peak_tree_rss or None
+        traces.append(trace)
+        print(f"Run {index + 1}/{runs}: loaded after {trace['ms_since_start']['load_finished']:.0f} ms")
+    return traces
+
+def summarize_startup(traces):
+    # Percentiles per startup step, in milliseconds since launch, and peak memory in MB
+    summary = {'runs': len(traces), 'steps': {}}
+    if not traces:
+        return summary
+    steps = list(dict.fromkeys(name for trace in traces for name in trace['ms_since_start']))
+    for name in steps:
+        values = [trace['ms_since_start'][name] for trace in traces if name in trace['ms_since_start']]
+        summary['steps'][name] = {
+            'p50': percentile(values, 0.5), 'p90': percentile(values, 0.9),
+            'p99': percentile(values, 0.99), 'min': min(values), 'max': max(values),
+        }
+    for key in ('peak_rss_bytes', 'peak_tree_rss_bytes'):
+        values = [trace[key] for trace in traces if trace.get(key)]
+        if values:
+            summary[key.replace('_bytes', '_mb')] = {
+                'p50': round(percentile(values, 0.5) / (1024 * 1024), 1),
+                'max': round(max(values) / (1024 * 1024), 1),
+            }
+    return summary
+
+def print_startup_summary(summary):
+    print(f"{'step (ms since launch)':<24}{'p50':>10}{'p90':>10}{'p99':>10}{'min':>10}{'max':>10}")
+    for name, step in summary['steps'].items():
+        print(f"{name:<24}" + "".join(f"{step[key]:>10.0f}" for key in ('p50', 'p90', 'p99', 'min', 'max')))
+    for key, label in (('peak_rss_mb', 'app process'), ('peak_tree_rss_mb', 'with renderers')):
+        if key in summary:
+            print(f"Peak RSS {label}: {summary[key]['p50']} MB median, {summary[key]['max']} MB max")
+
+def compare_profiles(executable, profiles, runs=5, timeout=60, use_xvfb=True, settle=2, verbose=False):
+    # Startup summary per runtime profile, selected through the app's
+    # WEBAPP_RUNTIME_PROFILE override so every profile runs the same executable
+    results = {}
+    for name in profiles:
+        print(f"Runtime profile {name}:")
+        traces = measure_startup(executable, runs, timeout, use_xvfb, env={'WEBAPP_RUNTIME_PROFILE': name},
+                                 verbose=verbose, settle=settle)
+        results[name] = summarize_startup(traces)
+    return results
+
+def print_profile_comparison(results):
+    # Medians per profile, with the memory change against the first profile
+    print(f"{'profile':<16}{'runs':>6}{'load ms':>10}{'app MB':>10}{'tree MB':>10}{'change':>10}")
+    baseline = None
+    for name, summary in results.items():
+        load = summary['steps'].get('load_finished', {}).get('p50')
+        app = summary.get('peak_rss_mb', {}).get('p50')
+        tree = summary.get('peak_tree_rss_mb', {}).get('p50')
+        if baseline is None:
+            baseline = tree
+        change = f"{(tree - baseline) / baseline * 100:+.1f}%" if tree and baseline else ''
+        print(f"{name:<16}{summary['runs']:>6}{'' if load is None else f'{load:.0f}':>10}"
+              f"{'' if app is None else f'{app:.1f}':>10}{'' if tree is None else f'{tree:.1f}':>10}{change:>10}")
@@ -2,184 +2,2672 @@ import codecs  # Add this import at the top of the file
 import sys
 import os
 import shutil
+import fnmatch
+import glob
+import hashlib
+import argparse
+import subprocess
+import json
+import struct
+import zipfile
+import mimetypes
+import collections
+import functools
+import tracemalloc
+import re
+import html as html_lib
+import posixpath
+import urllib.parse
+import base64
+import contextlib
+import logging
+import tempfile
+import threading
+import multiprocessing
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QFileDialog, QVBoxLayout, QWidget, QLabel, QProgressBar, QMessageBox, QComboBox # type: ignore
-from PyQt5.QtCore import Qt, QThread, pyqtSignal # type: ignore
-from PyQt5.QtCore import QUrl
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-from PyQt5.QtWidgets import QMessageBox
-from bs4 import BeautifulSoup
-import csscompressor
-import jsmin
-# With this more explicit import:
-try:
-    import PyInstaller.__main__ as pyi_main
-except ImportError:
-    print("PyInstaller not found. Please install it with: pip install pyinstaller")
-    sys.exit(1)
-from PyQt5.QtGui import QIcon 
+import importlib.util
+from PyQt5.QtCore import QThread, pyqtSignal # type: ignore
 import time
+# PyInstaller, the Qt widget and web engine modules, BeautifulSoup, lxml and
+# the minifiers are imported where they are used, so importing this module
+# (in scripts, build workers and queue jobs) stays fast and small. The GUI
+# imports its modules under __main__.
 
-# Global variables
+# GUI state
 input_path = None
 output_path = None
-temp_dir = None
 conversion_thread = None
+watch_thread = None
+preview_dir = None
+gui_build_options = {}
+
+# Folders and files skipped while scanning the input folder
+default_exclude_patterns = [
+    '.git', '.svn', '.hg', 'node_modules', '__pycache__', '.idea', '.vscode',
+    '.DS_Store', 'Thumbs.db', 'desktop.ini', '*~', '*.swp', '*.swo', '.#*', '#*#',
+]
 
 # Set the icon path and script directory
 script_dir = os.path.dirname(os.path.abspath(__file__))
 default_icon_path = os.path.join(script_dir, 'icon.ico')
 
+# Persistent cache of minified CSS/JS and rewritten HTML, keyed by content hash
+default_cache_dir = os.path.join(script_dir, 'build_cache')
+default_cache_max_bytes = 512 * 1024 * 1024
+default_pyinstaller_cache_dir = os.path.join(script_dir, 'pyinstaller_cache')
+# Runner stubs of instant builds kept there, about 170 MB each
+default_stub_cache_max_bytes = 1024 * 1024 * 1024
+# Finished executables, reused when a build's inputs, options and toolchain repeat
+default_artifact_cache_dir = os.path.join(script_dir, 'artifact_cache')
+default_artifact_cache_max_bytes = 2 * 1024 * 1024 * 1024
+# Job folder shared by the submit, serve and status commands
+default_queue_dir = os.path.join(script_dir, 'build_queue')
+queue_states = ('queued', 'running', 'done', 'failed')
+# BuildConfig fields that do not change the executable's contents. The expiry
+# only goes into the trailer appended after the cached part.
+artifact_key_ignored = {'input_path', 'output_path', 'temp_dir', 'work_dir', 'expiry_seconds', 'use_cache',
+                        'cache_dir', 'cache_max_bytes', 'workers', 'staging_mode', 'icon_path',
+                        'pyinstaller_subprocess', 'pyinstaller_cache_dir', 'artifact_cache_dir',
+                        'artifact_cache_max_bytes', 'overlap_pyinstaller', 'web_cache_mb', 'runtime_profile',
+                        'stub_cache_max_bytes'}
+exe_suffix = '.exe' if sys.platform == 'win32' else ''
+# Seconds an overlapped PyInstaller run waits for the site file list
+site_datas_timeout = 3600
+# Set HTML_TO_EXE_TRACEMALLOC=1 to also report the Python heap peak of each
+# bundle written without worker processes (slow, for debugging only)
+trace_bundle_memory = os.environ.get('HTML_TO_EXE_TRACEMALLOC') == '1'
+
+# Marker at the end of an instant build's payload trailer (see runner_script),
+# and the cookie PyInstaller's bootloader searches its executable for
+payload_magic = b'H2EPAYLD'
+pack_magic = b'H2EPACK1'
+pyinstaller_magic = b'MEI\014\013\012\013\016'
+
+# Progress shown when PyInstaller starts each build step
+pyinstaller_progress = {'startup': 52, 'Analysis': 55, 'PYZ': 70, 'PKG': 75, 'EXE': 88, 'COLLECT': 90}
+
+# MIME types served from a site pack that must not depend on the build
+# machine's registry (Windows maps .js to text/plain on some systems)
+web_mime_types = {
+    '.html': 'text/html', '.htm': 'text/html', '.css': 'text/css',
+    '.js': 'text/javascript', '.mjs': 'text/javascript', '.json': 'application/json',
+    '.svg': 'image/svg+xml', '.wasm': 'application/wasm', '.woff': 'font/woff',
+    '.woff2': 'font/woff2', '.mp3': 'audio/mpeg', '.mp4': 'video/mp4',
+}
+
+# How much of a page's body markup counts as above the fold for critical CSS
+default_critical_fold_bytes = 8 * 1024
+
+def css_minifier_version():
+    import csscompressor
+    return f"csscompressor-{csscompressor.__version__}"
+
+def js_minifier_version():
+    import jsmin
+    return f"jsmin-{jsmin.__version__}"
+
+expiry_options = {
+    "1 minutes": 60,
+    "1 hour": 3600,
+    "1 day": 86400,
+    "1 week": 604800,
+    "1 month": 2592000,
+    "1 year": 31536000,
+    "Lifetime": None
+}
+
+# Units accepted by parse_expiry(), e.g. "90s", "1d", "2w", "6mo"
+expiry_units = {
+    's': 1, 'min': 60, 'm': 60, 'h': 3600, 'd': 86400,
+    'w': 604800, 'mo': 2592000, 'y': 31536000,
+}
+
+class BuildConfig:
+    # Everything one build needs. Each build gets its own temp and PyInstaller
+    # work directories under output_path, so builds never share state.
+
+    def __init__(self, input_path, output_path, expiry_seconds=None, include_patterns=None,
+                 exclude_patterns=None, use_cache=True, cache_dir=default_cache_dir,
+                 cache_max_bytes=default_cache_max_bytes, workers=None, html_rewriter='stream',
+                 staging_mode='link', icon_path=default_icon_path, app_name='WebApp',
+                 pyinstaller_subprocess=False, pyinstaller_cache_dir=default_pyinstaller_cache_dir,
+                 instant=False, pack_assets=False, prune_assets=False, keep_patterns=None,
+                 bundle_mode='global', common_chunk_min_pages=2, prune_css=False, css_safelist=None,
+                 inline_limit=0, critical_css=False, critical_fold_bytes=default_critical_fold_bytes,
+                 dedupe_assets=False, artifact_cache_dir=default_artifact_cache_dir,
+                 artifact_cache_max_bytes=default_artifact_cache_max_bytes, overlap_pyinstaller=True,
+                 web_cache_mb=0, runtime_profile='default', stub_cache_max_bytes=default_stub_cache_max_bytes):
+        self.input_path = os.path.abspath(input_path)
+        self.output_path = os.path.abspath(output_path)
+        self.expiry_seconds = expiry_seconds
+        self.include_patterns = include_patterns
+        self.exclude_patterns = default_exclude_patterns if exclude_patterns is None else exclude_patterns
+        self.use_cache = use_cache
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        # Number of worker processes used to minify and rewrite files that are not cached
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        # HTML rewriter backend: 'stream', 'bs4' or 'lxml' (see html_rewriters)
+        self.html_rewriter = html_rewriter
+        # How assets reach temp_dir: 'link' (hardlink or copy-on-write clone,
+        # falling back to a copy), 'copy', or 'direct' (not staged at all;
+        # PyInstaller reads them from the input folder)
+        self.staging_mode = staging_mode
+        self.icon_path = icon_path
+        self.app_name = app_name
+        # Run PyInstaller in a child process so several builds can run at once in one process
+        self.pyinstaller_subprocess = pyinstaller_subprocess
+        # Shared PyInstaller work directories, one per toolchain (used unless use_cache is off)
+        self.pyinstaller_cache_dir = pyinstaller_cache_dir
+        # Least recently used runner stubs there are removed past this size
+        self.stub_cache_max_bytes = stub_cache_max_bytes
+        # Copy a prebuilt runner and append the site to it instead of running PyInstaller
+        self.instant = instant
+        # Append the site as an indexed pack that the runner memory-maps and
+        # serves through a custom URL scheme, instead of files PyInstaller
+        # extracts on every launch
+        self.pack_assets = pack_assets
+        # Only bundle images, fonts, media etc. that pages or stylesheets
+        # reference; keep_patterns lists files loaded dynamically by scripts
+        self.prune_assets = prune_assets
+        self.keep_patterns = keep_patterns or []
+        # 'global' merges all CSS and all JS into one bundle each; 'page' gives
+        # every page bundles built from its own stylesheets and scripts, with
+        # files used by at least common_chunk_min_pages pages split into
+        # shared chunks
+        self.bundle_mode = bundle_mode
+        self.common_chunk_min_pages = common_chunk_min_pages
+        # Drop CSS rules whose selectors name a tag, class or id that no page
+        # uses. css_safelist holds globs for names added by scripts.
+        self.prune_css = prune_css
+        self.css_safelist = css_safelist or []
+        # Images and fonts up to inline_limit bytes are embedded as data URIs
+        # (0 turns this off)
+        self.inline_limit = inline_limit
+        # Put the CSS needed by the first critical_fold_bytes of each page's
+        # body in a <style> block and load the full stylesheets after first paint
+        self.critical_css = critical_css
+        self.critical_fold_bytes = critical_fold_bytes
+        # Stage assets with identical contents once and point references to
+        # the other copies at it (site packs always store such files once)
+        self.dedupe_assets = dedupe_assets
+        # With use_cache, whole executables are kept here and reused for builds
+        # with the same key (see Builder.artifact_key); 0 turns this off
+        self.artifact_cache_dir = artifact_cache_dir
+        self.artifact_cache_max_bytes = artifact_cache_max_bytes
+        # Run the PyInstaller work that does not need the site (Analysis and
+        # PYZ, or the whole runner for instant and pack builds) in a child
+        # process while the site files are processed
+        self.overlap_pyinstaller = overlap_pyinstaller
+        # Give the app a persistent web profile under the user's app data
+        # folder with a disk cache of up to web_cache_mb MB, discarded when a
+        # new build of the app starts (0 keeps Qt's default profile)
+        self.web_cache_mb = web_cache_mb
+        # Chromium flags and web settings the app starts with: 'default' or
+        # 'low-memory' (see runtime_profiles in runner_script). The app's
+        # WEBAPP_RUNTIME_PROFILE environment variable overrides it.
+        self.runtime_profile = runtime_profile
+        self.temp_dir = os.path.join(self.output_path, 'temp')
+        self.work_dir = os.path.join(self.output_path, 'build')
+
+class Builder:
+    def __init__(self, config):
+        self.config = config
+        self.asset_manifest = None
+        self.staged_data = []
+        self.executable_path = None
+        # Site payload appended by instant and pack builds, recorded in the trailer
+        self.payload = None
+        # PyInstaller run started by start_packaging(), if any
+        self.packaging = None
+        # Staging mode used instead of config.staging_mode, if set
+        self.staging_mode = None
+        self.report = BuildReport()
+
+    def run(self, progress=None):
+        config = self.config
+        report = self.report
+        if progress is not None:
+            report.progress = progress
+
+        artifact_cache = None
+        if config.use_cache and config.artifact_cache_max_bytes:
+            artifact_cache = ArtifactCache(config.artifact_cache_dir, config.artifact_cache_max_bytes)
+            with report.stage('artifact key') as stage:
+                key, manifest = self.artifact_key(stage)
+            report.info['artifact_key'] = key
+        else:
+            manifest = None
+
+        if artifact_cache is not None and self.restore_artifact(artifact_cache, key):
+            report.info['artifact_cache'] = 'hit'
+        else:
+            if config.overlap_pyinstaller:
+                self.start_packaging()
+            try:
+                self.process_files(manifest)
+                report.files_processed()
+                self.create_executable()
+            except BaseException:
+                # Stop an overlapped run still waiting for the site files, so
+                # it does not keep the PyInstaller cache locked
+                self.abort_packaging()
+                raise
+            if artifact_cache is not None:
+                report.info['artifact_cache'] = 'miss'
+                with report.stage('artifact store'):
+                    artifact_cache.put(key, self.executable_path, self.payload)
+                    artifact_cache.prune()
+
+        # The creation time and expiry go after everything the cache stores
+        with report.stage('trailer'):
+            build_id = report.info.get('artifact_key')
+            if build_id is None and config.web_cache_mb:
+                build_id = file_digest(self.executable_path)
+            append_trailer(self.executable_path, self.payload, make_app_config(config, build_id))
+        report.set_progress(95)
+        with report.stage('cleanup'):
+            self.cleanup()
+        report.write(os.path.join(self.config.output_path, 'build-report.json'), self)
+        report.set_progress(100)
+        return self.executable_path
+
+    def process_files(self, asset_manifest=None):
+        config = self.config
+        temp_dir = config.temp_dir
+        os.makedirs(temp_dir, exist_ok=True)
+
+        report = self.report
+
+        # Scan the input folder once, or take the manifest artifact_key()
+        # just scanned; every stage below works from this manifest
+        with report.stage('scan') as stage:
+            if asset_manifest is None:
+                asset_manifest = scan_assets(config.input_path, config.include_patterns, config.exclude_patterns)
+            self.asset_manifest = asset_manifest
+            stage['files'] = len(asset_manifest)
+            stage['bytes'] = report.total_bytes = sum(a['size'] for a in asset_manifest)
+        print(f"Scanned {stage['files']} files ({stage['bytes']} bytes)")
+
+        build_cache = BuildCache(config.cache_dir, config.cache_max_bytes) if config.use_cache else None
+
+        # Paths referenced from pages and stylesheets, used to drop unreferenced assets
+        references = set()
+
+        def on_output(asset, text):
+            # Called for every CSS file, JS file and page as it is written
+            report.add(asset)
+            if config.prune_assets and asset['kind'] != 'js':
+                # The bundle and pages end up at the top level, so resolve
+                # references both from there and from the file's original folder
+                source_dir = posixpath.dirname(asset['rel_path'].replace(os.sep, '/'))
+                references.update(extract_references(text, [source_dir, '']))
+
+        html_assets = assets_of_kind(asset_manifest, 'html')
+
+        # Collect the tags, classes and ids the pages use before writing any CSS
+        css_pruner = None
+        if config.prune_css:
+            css_pruner = CssPruner(config.css_safelist)
+            with report.stage('css usage') as stage:
+                for asset in html_assets:
+                    css_pruner.collect_html(read_asset(asset).decode('utf-8', errors='ignore'))
+                    stage['files'] += 1
+                    stage['bytes'] += asset['size']
+        inliner = AssetInliner(asset_manifest, config.inline_limit) if config.inline_limit else None
+        critical_css_texts = {}
+
+        # Find assets that repeat another asset's contents before any
+        # reference to them is written
+        deduplicator = None
+        if config.dedupe_assets:
+            with report.stage('dedupe') as stage:
+                candidates = assets_of_kind(asset_manifest, 'mp3', 'asset')
+                deduplicator = AssetDeduplicator(candidates, config.keep_patterns)
+                stage['files'] = len(candidates)
+                stage['bytes'] = sum(a['size'] for a in candidates)
+
+        def finish_css(asset, text):
+            source_dir = posixpath.dirname(asset['rel_path'].replace(os.sep, '/'))
+            if css_pruner is not None:
+                text = css_pruner.prune(text)
+            if inliner is not None:
+                text = inliner.inline_css(text, [source_dir, ''])
+            if deduplicator is not None:
+                text = deduplicator.rewrite_css(text, [source_dir, ''])
+            return text
+
+        def finish_page(asset, html):
+            # Runs once the page's stylesheets are in temp_dir
+            page_dir = posixpath.dirname(asset['rel_path'].replace(os.sep, '/'))
+            if inliner is not None:
+                html = inliner.inline_page(html, [page_dir, ''])
+            if deduplicator is not None:
+                html = deduplicator.rewrite_page(html, [page_dir, ''])
+            if config.critical_css:
+                html = inline_critical_css(html, temp_dir, critical_css_texts,
+                                           config.critical_fold_bytes, config.css_safelist)
+            return html
+
+        # One pool of worker processes for the whole build, started by the
+        # first file missing from the cache (each start costs seconds where
+        # processes are spawned, as on Windows)
+        pool = WorkerPool(config.workers) if config.workers > 1 else None
+        with pool or contextlib.nullcontext():
+            if config.bundle_mode == 'page':
+                self.write_page_bundles(build_cache, html_assets, pool, on_output, finish_css, finish_page)
+            else:
+                # Minify CSS file by file (reusing cached output for unchanged files) and
+                # stream the results into the merged bundle
+                with report.stage('css'):
+                    write_bundle(build_cache, assets_of_kind(asset_manifest, 'css'), 'css', css_minifier_version(),
+                                 minify_css, os.path.join(temp_dir, 'styles.min.css'), "", config.workers,
+                                 on_output, finish_css, pool)
+
+                # Minify JavaScript file by file and merge
+                with report.stage('js'):
+                    write_bundle(build_cache, assets_of_kind(asset_manifest, 'js'), 'js', js_minifier_version(),
+                                 minify_js, os.path.join(temp_dir, 'scripts.min.js'), "\n", config.workers,
+                                 on_output, executor=pool)
+
+                # Process HTML files, rewriting pages in parallel
+                with report.stage('html'):
+                    rewrite, rewriter_version = html_rewriter(config.html_rewriter)
+                    pages = iter_transformed(build_cache, html_assets, 'html', rewriter_version, rewrite,
+                                             config.workers, pool)
+                    for asset, html in zip(html_assets, pages):
+                        html = finish_page(asset, html)
+                        with codecs.open(os.path.join(temp_dir, asset['name']), 'w', 'utf-8') as f:
+                            f.write(html)
+                        on_output(asset, html)
+
+        if css_pruner is not None:
+            css_pruner.report()
+        if inliner is not None:
+            inliner.report()
+
+        staged_assets = assets_of_kind(asset_manifest, 'mp3', 'asset')
+        if config.prune_assets:
+            with report.stage('prune assets'):
+                staged_assets = prune_unreferenced(staged_assets, references, config.keep_patterns)
+        if deduplicator is not None:
+            staged_assets = [asset for asset in staged_assets if not deduplicator.is_duplicate(asset)]
+            deduplicator.report(report)
+
+        # Stage .mp3 files and other assets (images, fonts, etc.) into the temp
+        # directory, linking instead of copying where the filesystem allows it
+        self.staged_data = []
+        stage_counts = collections.Counter()
+        with report.stage('assets') as stage:
+            for asset in staged_assets:
+                report.add(asset)
+                stage_counts[self.stage_asset(asset)] += 1
+            stage['methods'] = dict(stage_counts)
+        print("Staged asset files: " + ", ".join(f"{count} {method}" for method, count in sorted(stage_counts.items())))
+
+        if build_cache is not None:
+            with report.stage('cache prune'):
+                build_cache.prune()
+            report.info['build_cache'] = {'hits': build_cache.hits, 'misses': build_cache.misses}
+            print(f"Build cache: {build_cache.hits} hits, {build_cache.misses} misses")
+
+        # Generate license file
+        with report.stage('license'):
+            generate_license(config.output_path)
+
+    def artifact_key(self, stage):
+        # Hash of everything the executable depends on apart from the trailer:
+        # the input files, the options, the icon, this module (runner), the
+        # minifier and rewriter versions and the toolchain. Returns the key
+        # and the scanned manifest for process_files().
+        config = self.config
+        icon_path = self.icon_file()
+        parts = {
+            'options': {name: value for name, value in vars(config).items() if name not in artifact_key_ignored},
+            'icon': file_digest(icon_path) if icon_path else None,
+            'source': file_digest(os.path.abspath(__file__)),
+            'toolchain': toolchain_versions(),
+            'processors': {'css': css_minifier_version(), 'js': js_minifier_version(),
+                           'html': html_rewriter(config.html_rewriter)[1]},
+        }
+        digest = hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf-8'))
+        manifest = scan_assets(config.input_path, config.include_patterns, config.exclude_patterns)
+        # Every file is keyed by its contents. Digests of files whose stat is
+        # unchanged since an earlier build are reused instead of read again.
+        digests = DigestMemo(os.path.join(config.artifact_cache_dir, 'digests.json'))
+        for asset in manifest:
+            asset['hash'] = digests.digest(asset['path'])
+            digest.update(f"{asset['rel_path'].replace(os.sep, '/')}\0{asset['hash']}\0".encode('utf-8'))
+            stage['files'] += 1
+        stage['bytes'] = digests.hashed_bytes
+        stage['memo_hits'] = digests.hits
+        digests.save()
+        return digest.hexdigest(), manifest
+
+    def restore_artifact(self, artifact_cache, key):
+        config = self.config
+        executable_path = os.path.join(config.output_path, config.app_name + exe_suffix)
+        with self.report.stage('artifact restore'):
+            entry = artifact_cache.get(key, executable_path)
+        if entry is None:
+            print(f"Artifact cache: no previous build with key {key[:16]}")
+            return False
+        self.executable_path = executable_path
+        self.payload = entry['payload']
+        generate_license(config.output_path)
+        print(f"Artifact cache: reused the executable built earlier with key {key[:16]}")
+        return True
+
+    def start_packaging(self):
+        # Start the PyInstaller run that does not depend on the site files in
+        # a background thread: the runner stub for instant builds, the whole
+        # runner for pack builds, and otherwise the normal build, whose spec
+        # waits for the site file list after Analysis and PYZ
+        config = self.config
+        icon_path = self.icon_file()
+        if config.instant:
+            mode, target = 'stub', lambda: self.runner_stub(icon_path, background=True)
+        elif config.pack_assets:
+            mode, target = 'runner', lambda: self.run_runner_spec(
+                [], config.output_path, config.app_name, icon_path, 'runner', background=True)
+        else:
+            mode, target = 'site', lambda: self.run_runner_spec(
+                None, config.output_path, config.app_name, icon_path, 'runner', background=True)
+        os.makedirs(config.work_dir, exist_ok=True)
+        if mode == 'site':
+            # Cleared before the thread starts, so it cannot remove the null
+            # that abort_packaging() writes when processing fails early
+            datas_path = os.path.join(config.work_dir, 'runner_datas.json')
+            if os.path.exists(datas_path):
+                os.remove(datas_path)
+        packaging = self.packaging = {'mode': mode, 'error': None}
+
+        def work():
+            try:
+                target()
+            except BaseException as e:
+                packaging['error'] = e
+
+        packaging['thread'] = threading.Thread(target=work, name='pyinstaller', daemon=True)
+        packaging['thread'].start()
+
+    def wait_packaging(self, mode):
+        # Join the background run if it is doing the given step; returns
+        # False when that step still has to be run here
+        packaging = self.packaging
+        if packaging is None or packaging['mode'] != mode:
+            return False
+        with self.report.stage('wait for pyinstaller'):
+            packaging['thread'].join()
+        self.packaging = None
+        if packaging['error'] is not None:
+            raise packaging['error']
+        return True
+
+    def abort_packaging(self):
+        # Let a spec waiting for the site files exit, then wait for the run to
+        # end so it does not outlive the build. Stubs and runners finish, as
+        # the PyInstaller cache keeps their work for the next build.
+        packaging = self.packaging
+        if packaging is None:
+            return
+        if packaging['mode'] == 'site':
+            write_site_datas(os.path.join(self.config.work_dir, 'runner_datas.json'), None)
+        packaging['thread'].join()
+        self.packaging = None
+
+    def icon_file(self):
+        config = self.config
+        return config.icon_path if config.icon_path and os.path.exists(config.icon_path) else None
+
+    def stage_asset(self, asset):
+        config = self.config
+        staging_mode = self.staging_mode or config.staging_mode
+        rel_path = staged_rel_path(asset)
+        if staging_mode == 'direct':
+            # Leave the file where it is and let PyInstaller pick it up from there
+            self.staged_data.append((asset['path'], os.path.dirname(rel_path) or '.'))
+            return 'direct'
+        dest_path = os.path.join(config.temp_dir, rel_path)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        return stage_file(asset['path'], dest_path, staging_mode)
+
+    def update_files(self, changed, removed):
+        # Incremental rebuild for watch mode: redo only the bundles, pages and
+        # assets that the changed or removed files feed into
+        config = self.config
+        if (config.bundle_mode == 'page' or config.prune_css or config.critical_css
+                or config.inline_limit or config.prune_assets or config.dedupe_assets):
+            # With these options one file's output depends on other files
+            self.report = BuildReport()
+            self.process_files()
+            return
+
+        # One file at a time is quicker without starting worker processes
+        build_cache = BuildCache(config.cache_dir, config.cache_max_bytes) if config.use_cache else None
+        kinds = {asset['kind'] for asset in changed + removed}
+        if 'css' in kinds:
+            write_bundle(build_cache, assets_of_kind(self.asset_manifest, 'css'), 'css', css_minifier_version(),
+                         minify_css, os.path.join(config.temp_dir, 'styles.min.css'), "", 1)
+        if 'js' in kinds:
+            write_bundle(build_cache, assets_of_kind(self.asset_manifest, 'js'), 'js', js_minifier_version(),
+                         minify_js, os.path.join(config.temp_dir, 'scripts.min.js'), "\n", 1)
+
+        pages = [asset for asset in changed if asset['kind'] == 'html']
+        rewrite, rewriter_version = html_rewriter(config.html_rewriter)
+        for asset, html in zip(pages, iter_transformed(build_cache, pages, 'html', rewriter_version, rewrite, 1)):
+            with codecs.open(os.path.join(config.temp_dir, asset['name']), 'w', 'utf-8') as f:
+                f.write(html)
+
+        for asset in changed:
+            if asset['kind'] in ('mp3', 'asset'):
+                self.stage_asset(asset)
+        for asset in removed:
+            if asset['kind'] in ('html', 'mp3', 'asset'):
+                rel_path = staged_rel_path(asset) if asset['kind'] != 'html' else asset['name']
+                try:
+                    os.remove(os.path.join(config.temp_dir, rel_path))
+                except OSError:
+                    pass
+
+        # Every save adds entries, so a long watch session would otherwise
+        # grow the cache without limit
+        if build_cache is not None:
+            build_cache.prune()
+
+    def write_page_bundles(self, build_cache, html_assets, pool, on_output, finish_css, finish_page):
+        # Split CSS and JS per page: each run of consecutive stylesheets or
+        # scripts on a page becomes one chunk, so pages only load their own
+        # code in their own order. Chunks are named by their contents, so pages
+        # with the same run share the file.
+        config = self.config
+        by_path = {asset['rel_path'].replace(os.sep, '/'): asset
+                   for asset in assets_of_kind(self.asset_manifest, 'css', 'js')}
+
+        # First pass: list each page's stylesheet and script references
+        page_tags = []
+        with self.report.stage('page scan') as stage:
+            for asset in html_assets:
+                text = read_asset(asset).decode('utf-8', errors='ignore')
+                page_dir = posixpath.dirname(asset['rel_path'].replace(os.sep, '/'))
+                page_tags.append([tag[1:] for tag in page_bundle_tags(text, page_dir, by_path)])
+                stage['files'] += 1
+                stage['bytes'] += asset['size']
+
+        pages_using = collections.defaultdict(set)
+        for index, tags in enumerate(page_tags):
+            for _, rel_path, _ in tags:
+                if rel_path is not None:
+                    pages_using[rel_path].add(index)
+
+        def sharing(rel_path, page_index):
+            # Files on few pages are merged with the rest of the page's run
+            pages = pages_using[rel_path]
+            if len(pages) >= config.common_chunk_min_pages:
+                return frozenset(pages)
+            return page_index
+
+        # Plan which chunks each page loads
+        chunks = {}
+        page_actions = []
+        for index in range(len(html_assets)):
+            runs = page_chunk_runs(page_tags[index], lambda rel_path: sharing(rel_path, index))
+            actions = {}
+            for run in runs:
+                kind = run['kind']
+                digest = hashlib.sha256('\0'.join([kind] + run['paths']).encode('utf-8')).hexdigest()[:12]
+                name = f"styles.{digest}.min.css" if kind == 'css' else f"scripts.{digest}.min.js"
+                chunks.setdefault(name, (kind, run['paths'], set()))[2].add(index)
+                actions[run['tags'][0]] = name
+                for tag_index in run['tags'][1:]:
+                    actions[tag_index] = None
+            page_actions.append(actions)
+
+        # The build's pool serves every chunk and the pages
+        chunk_sizes = self.write_chunks(build_cache, chunks, by_path, pool, on_output, finish_css)
+
+        # Rewrite each page to load its chunks, through the HTML cache
+        with self.report.stage('html'):
+            actions_by_path = {asset['rel_path']: actions for asset, actions in zip(html_assets, page_actions)}
+
+            def page_job(asset):
+                # The cached page depends on the chunks it is pointed at
+                actions = actions_by_path[asset['rel_path']]
+                key = hashlib.sha256(json.dumps(sorted(actions.items())).encode('utf-8')).hexdigest()[:16]
+                return f"page-bundles-1-{key}", functools.partial(rewrite_chunked_page, actions)
+
+            pages = iter_transformed(build_cache, html_assets, 'html', None, None, config.workers, pool, page_job)
+            for asset, html in zip(html_assets, pages):
+                html = finish_page(asset, html)
+                with codecs.open(os.path.join(config.temp_dir, asset['name']), 'w', 'utf-8') as f:
+                    f.write(html)
+                on_output(asset, html)
+
+        shared = sum(1 for _, _, pages in chunks.values() if len(pages) > 1)
+        total = sum(chunk_sizes.values())
+        loaded = [sum(chunk_sizes[name] for name in set(actions.values()) - {None}) for actions in page_actions]
+        average = sum(loaded) / len(loaded) if loaded else 0
+        print(f"Per-page bundles: {len(chunks)} chunks ({shared} shared by several pages, "
+              f"{total} bytes); pages load {average:.0f} bytes of CSS/JS on average, "
+              f"at most {max(loaded, default=0)}")
+
+    def write_chunks(self, build_cache, chunks, by_path, executor, on_output, finish_css):
+        # Write every chunk once, minifying through the build cache
+        config = self.config
+        chunk_sizes = {}
+        with self.report.stage('chunks'):
+            for name, (kind, paths, _) in sorted(chunks.items()):
+                assets = [by_path[path] for path in paths]
+                if kind == 'css':
+                    outputs = iter_transformed(build_cache, assets, 'css', css_minifier_version(), minify_css,
+                                               config.workers, executor)
+                    separator = ""
+                else:
+                    outputs = iter_transformed(build_cache, assets, 'js', js_minifier_version(), minify_js,
+                                               config.workers, executor)
+                    separator = "\n"
+                chunk_path = os.path.join(config.temp_dir, name)
+                with open(chunk_path, 'w', encoding='utf-8', newline='') as f:
+                    for chunk_index, (chunk_asset, text) in enumerate(zip(assets, outputs)):
+                        if kind == 'css':
+                            text = finish_css(chunk_asset, text)
+                        if chunk_index:
+                            if kind == 'css':
+                                text = strip_charset(text)
+                            f.write(separator)
+                        f.write(text)
+                        on_output(chunk_asset, text)
+                chunk_sizes[name] = os.path.getsize(chunk_path)
+        return chunk_sizes
+
+    def create_executable(self):
+        config = self.config
+        report = self.report
+        os.makedirs(config.work_dir, exist_ok=True)
+
+        with report.stage('prepare'):
+            icon_to_use, datas = self.prepare()
+
+        if config.instant:
+            self.wait_packaging('stub')
+            if self.create_from_stub(datas, icon_to_use):
+                return
+
+        executable_path = os.path.join(config.output_path, config.app_name + exe_suffix)
+        if config.pack_assets:
+            # Build the runner alone and append the site pack to it
+            if not self.wait_packaging('runner'):
+                self.run_runner_spec([], config.output_path, config.app_name, icon_to_use, 'runner')
+            pack_path = os.path.join(config.work_dir, 'site.pack')
+            with report.stage('site pack') as stage:
+                stage['duplicate_bytes'] = write_site_pack(pack_path, datas)
+                stage['files'] = len(datas)
+                stage['bytes'] = os.path.getsize(pack_path)
+            print_pack_savings(stage['duplicate_bytes'])
+            with report.stage('append payload'):
+                self.payload = append_payload(executable_path, pack_path, 'pack')
+            if self.payload:
+                self.executable_path = executable_path
+                return
+            print("The site contains PyInstaller's archive marker, bundling it as data instead")
+
+        if self.packaging is not None and self.packaging['mode'] == 'site':
+            # Analysis has been running alongside process_files(); hand it the site
+            write_site_datas(os.path.join(config.work_dir, 'runner_datas.json'), datas)
+            self.wait_packaging('site')
+            report.set_progress(pyinstaller_progress['COLLECT'])
+        else:
+            self.run_runner_spec(datas, config.output_path, config.app_name, icon_to_use, 'runner')
+        self.executable_path = executable_path
+
+    def prepare(self):
+        # Put the icon and license next to the staged site and list the files
+        # to bundle. Returns the icon to use (None if it is missing) and the list.
+        config = self.config
+        icon_to_use = self.icon_file()
+
+        # The site may have its own icon.ico or LICENSE staged as a hardlink
+        # to the source file, so replace the path instead of copying onto it
+        if icon_to_use:
+            stage_file(icon_to_use, os.path.join(config.temp_dir, 'icon.ico'), 'copy')
+        stage_file(os.path.join(config.output_path, 'LICENSE'), os.path.join(config.temp_dir, 'LICENSE'), 'copy')
+        return icon_to_use, site_datas(config.temp_dir, self.staged_data)
+
+    def run_runner_spec(self, datas, dist_path, app_name, icon_path, spec_name, background=False):
+        # With datas None the spec waits for write_site_datas() after PYZ;
+        # the caller clears any earlier datas file first.
+        # Background runs use a child process whose log is parsed for the
+        # progress like that of a run in this process.
+        config = self.config
+
+        # Reuse one PyInstaller work directory per toolchain so repeat builds
+        # skip Analysis and PYZ. A build that finds it busy uses its own folder.
+        shared_dir = None
+        if config.use_cache:
+            shared_dir = os.path.join(config.pyinstaller_cache_dir, toolchain_key())
+            os.makedirs(shared_dir, exist_ok=True)
+            if not acquire_lock(os.path.join(shared_dir, 'build.lock')):
+                print("PyInstaller cache is in use by another build, using a private work folder")
+                shared_dir = None
+        runner_dir = shared_dir or config.work_dir
+
+        try:
+            main_script = create_main_script(runner_dir)
+            datas_path = os.path.join(config.work_dir, f'{spec_name}_datas.json')
+            if datas is not None:
+                write_site_datas(datas_path, datas)
+            spec_path = os.path.join(config.work_dir, f'{spec_name}.spec')
+            with open(spec_path, 'w', encoding='utf-8') as f:
+                f.write(runner_spec.format(datas_path=datas_path, script_path=main_script,
+                                           app_name=app_name, icon_path=icon_path,
+                                           timeout=site_datas_timeout))
+
+            with self.report.stage('pyinstaller') as stage:
+                stage['files'] = len(datas or [])
+                stage['phases'] = run_pyinstaller([
+                    '--noconfirm',
+                    '--distpath=%s' % dist_path,
+                    '--workpath=%s' % os.path.join(runner_dir, 'work'),
+                    spec_path
+                ], config.pyinstaller_subprocess or background, self.report.pyinstaller_phase)
+        finally:
+            if shared_dir:
+                os.remove(os.path.join(shared_dir, 'build.lock'))
+
+    def runner_stub(self, icon_path, background=False):
+        # The runner without any site files, built once per toolchain and icon
+        config = self.config
+        stub_key = hashlib.sha256(runner_script.encode('utf-8'))
+        if icon_path:
+            with open(icon_path, 'rb') as f:
+                stub_key.update(f.read())
+        if config.use_cache:
+            stub_dir = os.path.join(config.pyinstaller_cache_dir, toolchain_key(), 'stub-' + stub_key.hexdigest()[:16])
+        else:
+            stub_dir = os.path.join(config.work_dir, 'stub')
+        stub_path = os.path.join(stub_dir, 'runner' + exe_suffix)
+        if os.path.exists(stub_path):
+            if config.use_cache:
+                # Marks the stub as recently used for prune_runner_stubs()
+                os.utime(stub_dir)
+            return stub_path
+        print("Building the runner stub, this is only needed once per toolchain")
+        # Build next to the final location so a concurrent build never sees a
+        # partial stub; every build gets its own folder, even within one process
+        os.makedirs(os.path.dirname(stub_dir), exist_ok=True)
+        partial_dir = tempfile.mkdtemp(prefix=os.path.basename(stub_dir) + '.', suffix='.tmp',
+                                       dir=os.path.dirname(stub_dir))
+        try:
+            with self.report.stage('runner stub'):
+                self.run_runner_spec([], partial_dir, 'runner', icon_path, 'stub', background)
+            os.makedirs(stub_dir, exist_ok=True)
+            os.replace(os.path.join(partial_dir, 'runner' + exe_suffix), stub_path)
+        finally:
+            shutil.rmtree(partial_dir, ignore_errors=True)
+        if config.use_cache:
+            prune_runner_stubs(config.pyinstaller_cache_dir, config.stub_cache_max_bytes, stub_dir)
+        return stub_path
+
+    def create_from_stub(self, datas, icon_path):
+        config = self.config
+        stub_path = self.runner_stub(icon_path)
+        with self.report.stage('site pack' if config.pack_assets else 'site zip') as stage:
+            if config.pack_assets:
+                payload_path = os.path.join(config.work_dir, 'site.pack')
+                stage['duplicate_bytes'] = write_site_pack(payload_path, datas)
+                print_pack_savings(stage['duplicate_bytes'])
+                payload_format = 'pack'
+            else:
+                payload_path = os.path.join(config.work_dir, 'site_payload.zip')
+                write_site_zip(payload_path, datas)
+                payload_format = 'zip'
+            stage['files'] = len(datas)
+            stage['bytes'] = os.path.getsize(payload_path)
+
+        executable_path = os.path.join(config.output_path, config.app_name + exe_suffix)
+        with self.report.stage('append payload'):
+            shutil.copyfile(stub_path, executable_path)
+            shutil.copymode(stub_path, executable_path)
+            self.payload = append_payload(executable_path, payload_path, payload_format)
+        if not self.payload:
+            print("The site contains PyInstaller's archive marker, falling back to a full build")
+            os.remove(executable_path)
+            return False
+        self.executable_path = executable_path
+        print(f"Instant build: appended {os.path.getsize(payload_path)} byte site payload to the runner stub")
+        return True
+
+    def cleanup(self):
+        # Builds restored from the artifact cache never create temp_dir
+        shutil.rmtree(self.config.temp_dir, ignore_errors=True)
+        shutil.rmtree(self.config.work_dir, ignore_errors=True)
+
 class ConversionThread(QThread):
     progress = pyqtSignal(int)
     finished = pyqtSignal()
     error = pyqtSignal(str)
 
-    def __init__(self, expiry_selection):
+    def __init__(self, config):
         super().__init__()
-        self.expiry_selection = expiry_selection
+        self.config = config
 
     def run(self):
         try:
-            self.progress.emit(10)
-            process_files()
-            self.progress.emit(50)
-            create_executable(self.expiry_selection)
-            self.progress.emit(90)
-            cleanup()
+            Builder(self.config).run(self.progress.emit)
             self.finished.emit()
         except Exception as e:
             self.error.emit(str(e))
 
-def process_files():
-    global temp_dir
-    os.makedirs(temp_dir, exist_ok=True)
-    
-    # Merge and minify CSS
-    css_content = ""
-    for root, _, files in os.walk(input_path):
-        for file in files:
-            if file.endswith('.css'):
-                with codecs.open(os.path.join(root, file), 'r', 'utf-8', errors='ignore') as f:
-                    css_content += f.read() + "\n"
-    minified_css = csscompressor.compress(css_content)
-    with codecs.open(os.path.join(temp_dir, 'styles.min.css'), 'w', 'utf-8') as f:
-        f.write(minified_css)
-
-    # Merge and minify JavaScript
-    js_content = ""
-    for root, _, files in os.walk(input_path):
-        for file in files:
-            if file.endswith('.js'):
-                with codecs.open(os.path.join(root, file), 'r', 'utf-8', errors='ignore') as f:
-                    js_content += f.read() + "\n"
-    minified_js = jsmin.jsmin(js_content)
-    with codecs.open(os.path.join(temp_dir, 'scripts.min.js'), 'w', 'utf-8') as f:
-        f.write(minified_js)
-
-    # Process HTML files
-    for root, _, files in os.walk(input_path):
-        for file in files:
-            if file.endswith('.html'):
-                with codecs.open(os.path.join(root, file), 'r', 'utf-8', errors='ignore') as f:
-                    soup = BeautifulSoup(f.read(), 'html.parser')
-                
-                # Update CSS links
-                for css_link in soup.find_all('link', rel='stylesheet'):
-                    css_link['href'] = 'styles.min.css'
-                
-                # Update JS scripts
-                for script in soup.find_all('script', src=True):
-                    script['src'] = 'scripts.min.js'
-                
-                with codecs.open(os.path.join(temp_dir, file), 'w', 'utf-8') as f:
-                    f.write(str(soup))
-
-            # Copy .mp3 files to temp directory
-            elif file.endswith('.mp3'):
-                shutil.copy(os.path.join(root, file), os.path.join(temp_dir, file))
-                print(f"Copied .mp3 file: {file}")
-
-    # Copy other asset files (images, fonts, etc.)
-    for root, _, files in os.walk(input_path):
-        for file in files:
-            if not file.endswith(('.html', '.css', '.js', '.mp3')):
-                # Preserve directory structure for assets
-                rel_path = os.path.relpath(os.path.join(root, file), input_path)
-                dest_path = os.path.join(temp_dir, rel_path)
-                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                shutil.copy(os.path.join(root, file), dest_path)
-                print(f"Copied asset file: {file}")
-
-    # Generate license file
-    generate_license()
-
-def create_executable(expiry_selection):
-    global temp_dir, output_path
-    main_script = create_main_script()
-    
-    # Use the default icon path if it exists, otherwise use None
-    icon_to_use = default_icon_path if os.path.exists(default_icon_path) else None
-    
-    icon_param = ['--icon', icon_to_use] if icon_to_use else []
-    
-    # Ensure the icon file is copied to the temp directory if it exists
-    if icon_to_use:
-        shutil.copy(icon_to_use, os.path.join(temp_dir, 'icon.ico'))
-    
-    # Copy the license file to the temp directory
-    shutil.copy(os.path.join(output_path, 'LICENSE'), os.path.join(temp_dir, 'LICENSE'))
-    
-    """ PyInstaller.__main__.run([
-        '--name=WebApp',
-        '--onefile',
-        '--windowed',
-        f'--add-data={temp_dir}{os.pathsep}.',  # Use os.pathsep for cross-platform compatibility
-        '--distpath=%s' % output_path,  # Specify the output directory
-        *icon_param,
-        main_script
-    ]) """
-
-    pyi_main.run([
-        '--name=WebApp',
-        '--onefile',
-        '--windowed',
-        f'--add-data={temp_dir}{os.pathsep}.',
-        '--distpath=%s' % output_path,
-        *icon_param,
-        main_script
-    ])
-
-    os.remove(main_script)
-
-def create_main_script():
-    expiry_selection = expiry_combo.currentText()
-    expiry_seconds = expiry_options[expiry_selection]
-    
-    script_content = """
+class SiteWatcher:
+    # Polls the input folder and hands changed files to Builder.update_files,
+    # keeping temp_dir up to date for a live preview
+
+    def __init__(self, builder):
+        self.builder = builder
+        if builder.config.staging_mode == 'direct':
+            # The preview reads every file from temp_dir. Only this builder
+            # stages differently; the config may be shared with later builds.
+            builder.staging_mode = 'link'
+        self.snapshot = {}
+
+    def start(self):
+        self.builder.process_files()
+        self.snapshot = self.take_snapshot(self.builder.asset_manifest)
+
+    @staticmethod
+    def take_snapshot(manifest):
+        return {asset['rel_path']: (asset['size'], asset['mtime']) for asset in manifest}
+
+    def poll(self):
+        # Returns the changed and removed files, or None when nothing changed
+        config = self.builder.config
+        manifest = scan_assets(config.input_path, config.include_patterns, config.exclude_patterns)
+        snapshot = self.take_snapshot(manifest)
+        if snapshot == self.snapshot:
+            return None
+        changed = [asset for asset in manifest if self.snapshot.get(asset['rel_path']) != (asset['size'], asset['mtime'])]
+        removed = [asset for asset in self.builder.asset_manifest if asset['rel_path'] not in snapshot]
+        started = time.perf_counter()
+        self.builder.asset_manifest = manifest
+        try:
+            self.builder.update_files(changed, removed)
+        except Exception as e:
+            # Keep watching; the next save usually fixes it
+            print(f"Rebuild failed: {e}")
+        self.snapshot = snapshot
+        print(f"Rebuilt {len(changed)} changed and {len(removed)} removed files "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return changed + removed
+
+class WatchThread(QThread):
+    rebuilt = pyqtSignal(str)
+    error = pyqtSignal(str)
+
+    def __init__(self, config, interval_ms=500):
+        super().__init__()
+        self.config = config
+        self.interval_ms = interval_ms
+        self.running = True
+
+    def run(self):
+        try:
+            watcher = SiteWatcher(Builder(self.config))
+            watcher.start()
+        except Exception as e:
+            self.error.emit(str(e))
+            return
+        self.rebuilt.emit(self.config.temp_dir)
+        while self.running:
+            self.msleep(self.interval_ms)
+            if watcher.poll():
+                self.rebuilt.emit(self.config.temp_dir)
+
+    def stop(self):
+        self.running = False
+
+def stage_file(src, dest, mode):
+    # Put src at dest as cheaply as possible and return how it was done.
+    # A linked file shares its data with the source, so nothing may open a
+    # staged path for writing: files generated into temp_dir go through
+    # stage_file too, which removes whatever is at dest first.
+    if os.path.lexists(dest):
+        os.remove(dest)
+    if mode == 'link':
+        try:
+            os.link(src, dest)
+            return 'linked'
+        except OSError:
+            pass
+        if clone_file(src, dest):
+            return 'cloned'
+    shutil.copy(src, dest)
+    return 'copied'
+
+def clone_file(src, dest):
+    # Copy-on-write clone (reflink) or in-kernel copy where the platform offers one
+    if sys.platform.startswith('linux'):
+        import fcntl
+        with open(src, 'rb') as fsrc, open(dest, 'wb') as fdst:
+            try:
+                fcntl.ioctl(fdst.fileno(), 0x40049409, fsrc.fileno())  # FICLONE
+                return True
+            except OSError:
+                pass
+            if hasattr(os, 'copy_file_range'):
+                try:
+                    remaining = os.fstat(fsrc.fileno()).st_size
+                    while remaining > 0:
+                        copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                        if copied == 0:
+                            break
+                        remaining -= copied
+                    return remaining == 0
+                except OSError:
+                    pass
+        return False
+    if sys.platform == 'darwin':
+        import ctypes
+        try:
+            clonefile = ctypes.CDLL(None, use_errno=True).clonefile
+        except (OSError, AttributeError):
+            return False
+        return clonefile(os.fsencode(src), os.fsencode(dest), 0) == 0
+    return False
+
+def minify_css(text):
+    import csscompressor
+    return csscompressor.compress(text)
+
+# A minified stylesheet's @charset rule, which csscompressor puts first
+leading_charset_re = re.compile(r'^\s*@charset\s+"[^"]*";', re.I)
+
+def strip_charset(text):
+    # Browsers ignore @charset anywhere but at the very start of a
+    # stylesheet, so files after the first in a bundle drop theirs
+    return leading_charset_re.sub('', text, count=1)
+
+def minify_js(text):
+    import jsmin
+    return jsmin.jsmin(text)
+
+def rewrite_html_bs4(text):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(text, 'html.parser')
+
+    # Update CSS links
+    for css_link in soup.find_all('link', rel='stylesheet'):
+        css_link['href'] = 'styles.min.css'
+
+    # Update JS scripts
+    for script in soup.find_all('script', src=True):
+        script['src'] = 'scripts.min.js'
+
+    return str(soup)
+
+def rewrite_html_lxml(text):
+    import lxml.etree
+    import lxml.html
+    try:
+        doc = lxml.html.document_fromstring(text)
+    except ValueError:
+        # lxml refuses str input carrying an XML encoding declaration
+        doc = lxml.html.document_fromstring(text.encode('utf-8'))
+    except lxml.etree.ParserError:
+        # Empty document
+        return text
+
+    for css_link in doc.iter('link'):
+        if 'stylesheet' in (css_link.get('rel') or '').split():
+            css_link.set('href', 'styles.min.css')
+    for script in doc.iter('script'):
+        if script.get('src') is not None:
+            script.set('src', 'scripts.min.js')
+
+    doctype = doc.getroottree().docinfo.doctype
+    return lxml.html.tostring(doc, encoding='unicode', method='html', doctype=doctype or None)
+
+# Tokens the streaming rewriter cares about: comments, raw text elements
+# (skipped whole, as browsers do), and start tags with their attribute text
+html_token_re = re.compile(
+    r'<!--.*?(?:-->|\Z)'
+    r'|<(?P<raw>script|style|textarea|title)\b(?P<raw_attrs>(?:[^>"\']|"[^"]*"|\'[^\']*\')*)>.*?(?:</(?P=raw)\s*>|\Z)'
+    r'|<(?P<name>[a-zA-Z][^\s/>]*)(?P<attrs>(?:[^>"\']|"[^"]*"|\'[^\']*\')*)>',
+    re.S | re.I)
+html_attr_re = re.compile(r'(?P<name>[^\s=/>"\']+)(?:\s*=\s*(?P<value>"[^"]*"|\'[^\']*\'|[^\s>]+))?')
+
+def parse_tag_attrs(attr_text):
+    # Map lowercased attribute name -> match, last occurrence winning
+    return {m.group('name').lower(): m for m in html_attr_re.finditer(attr_text)}
+
+def attr_value(match):
+    value = match.group('value')
+    if value is None:
+        return ''
+    if value[:1] in ('"', "'"):
+        value = value[1:-1]
+    return html_lib.unescape(value)
+
+def set_tag_attr(attr_text, attrs, name, value):
+    # Replace just the value of one attribute, copying everything else verbatim
+    match = attrs.get(name)
+    if match is None:
+        stripped = attr_text.rstrip()
+        if stripped.endswith('/'):
+            return f'{stripped[:-1].rstrip()} {name}="{value}"/'
+        return f'{stripped} {name}="{value}"'
+    return f'{attr_text[:match.start()]}{match.group("name")}="{value}"{attr_text[match.end():]}'
+
+def rewrite_html_stream(text):
+    # Tag-level rewrite: only the matched href/src values change, the rest of
+    # the page is copied through untouched
+    out = []
+    pos = 0
+    for token in html_token_re.finditer(text):
+        if token.group('raw'):
+            if token.group('raw').lower() != 'script':
+                continue
+            attr_text = token.group('raw_attrs')
+            attrs = parse_tag_attrs(attr_text)
+            if 'src' not in attrs:
+                continue
+            new_attrs = set_tag_attr(attr_text, attrs, 'src', 'scripts.min.js')
+            start = token.start('raw_attrs')
+            end = token.end('raw_attrs')
+        elif token.group('name') and token.group('name').lower() == 'link':
+            attr_text = token.group('attrs')
+            attrs = parse_tag_attrs(attr_text)
+            if 'rel' not in attrs or 'stylesheet' not in attr_value(attrs['rel']).split():
+                continue
+            new_attrs = set_tag_attr(attr_text, attrs, 'href', 'styles.min.css')
+            start = token.start('attrs')
+            end = token.end('attrs')
+        else:
+            continue
+        out.append(text[pos:start])
+        out.append(new_attrs)
+        pos = end
+    out.append(text[pos:])
+    return ''.join(out)
+
+def bs4_rewriter_version():
+    import bs4
+    return f"bs4-{bs4.__version__}-1"
+
+def lxml_rewriter_version():
+    import lxml.etree
+    return f"lxml-{lxml.etree.__version__}-1"
+
+# Backend -> (rewrite function, cache version function). Bump a backend's
+# version whenever its output changes, so cached pages are rebuilt.
+html_rewriters = {
+    'stream': (rewrite_html_stream, lambda: 'stream-1'),
+    'bs4': (rewrite_html_bs4, bs4_rewriter_version),
+    'lxml': (rewrite_html_lxml, lxml_rewriter_version),
+}
+
+def html_rewriter(name):
+    rewrite, version = html_rewriters[name]
+    return rewrite, version()
+
+def page_bundle_tags(text, page_dir, by_path):
+    # Yield (token, kind, rel_path, attrs) for every stylesheet link, <style>
+    # and <script> in page order. rel_path is the referenced CSS/JS file in
+    # by_path, or None for inline code and other files, which end a run of
+    # bundleable tags.
+    for token in html_token_re.finditer(text):
+        raw = (token.group('raw') or '').lower()
+        if raw == 'style':
+            yield token, 'css', None, ()
+            continue
+        if raw == 'script':
+            attrs = parse_tag_attrs(token.group('raw_attrs'))
+            kind, ref_attr = 'js', 'src'
+        elif (token.group('name') or '').lower() == 'link':
+            attrs = parse_tag_attrs(token.group('attrs'))
+            if 'rel' not in attrs or 'stylesheet' not in attr_value(attrs['rel']).split():
+                continue
+            kind, ref_attr = 'css', 'href'
+        else:
+            continue
+        rel_path = None
+        ref = attr_value(attrs[ref_attr]) if ref_attr in attrs else ''
+        for base_dir in (page_dir, ''):
+            path = resolve_reference(ref, base_dir)
+            if path in by_path and by_path[path]['kind'] == kind:
+                rel_path = path
+                break
+        # Tags only merge when everything but the file (media, async, ...) matches
+        other_attrs = tuple(sorted((name, attr_value(m)) for name, m in attrs.items() if name != ref_attr))
+        yield token, kind, rel_path, other_attrs
+
+def page_chunk_runs(tags, sharing):
+    # Group consecutive tags of one kind with the same attributes and the
+    # same sharing key into runs: {'kind', 'paths', 'tags' (tag indexes)}
+    runs = []
+    current = {'css': None, 'js': None}
+    for index, (kind, rel_path, attrs) in enumerate(tags):
+        if rel_path is None:
+            current[kind] = None
+            continue
+        key = (attrs, sharing(rel_path))
+        run = current[kind]
+        if run is None or run['key'] != key:
+            run = current[kind] = {'kind': kind, 'key': key, 'paths': [], 'tags': []}
+            runs.append(run)
+        run['paths'].append(rel_path)
+        run['tags'].append(index)
+    return runs
+
+def rewrite_page_bundles(text, tags, actions):
+    # actions maps tag index -> chunk name for the first tag of a run, or
+    # None for the following tags of the run, which are removed
+    out = []
+    pos = 0
+    for index, (token, kind, _, _) in enumerate(tags):
+        if index not in actions:
+            continue
+        out.append(text[pos:token.start()])
+        if actions[index] is not None:
+            group = 'attrs' if kind == 'css' else 'raw_attrs'
+            attr_text = token.group(group)
+            attrs = parse_tag_attrs(attr_text)
+            ref_attr = 'href' if kind == 'css' else 'src'
+            out.append(text[token.start():token.start(group)])
+            out.append(set_tag_attr(attr_text, attrs, ref_attr, actions[index]))
+            out.append(text[token.end(group):token.end()])
+        pos = token.end()
+    out.append(text[pos:])
+    return ''.join(out)
+
+def rewrite_chunked_page(actions, text):
+    # Pool-friendly page rewrite for per-page bundles
+    return rewrite_page_bundles(text, page_bundle_tags(text, '', {}), actions)
+
+def dom_signature(text):
+    # Parse with one parser and list (tag, attributes, text) per element, so
+    # outputs of different rewriters can be compared regardless of formatting
+    import lxml.etree
+    import lxml.html
+    try:
+        doc = lxml.html.document_fromstring(text.encode('utf-8'))
+    except lxml.etree.ParserError:
+        return []
+    signature = []
+    for element in doc.iter():
+        if not isinstance(element.tag, str):
+            continue
+        # Boolean attributes serialize as either name="" or name="name"
+        attrs = sorted((name, '' if value == name else value) for name, value in element.attrib.items())
+        signature.append((element.tag, attrs, ' '.join((element.text or '').split())))
+    return signature
+
+def check_rewriters(root_path, include=None, exclude=None):
+    # Rewrite every page with each backend and report pages whose DOMs differ
+    mismatches = []
+    for asset in assets_of_kind(scan_assets(root_path, include, exclude), 'html'):
+        text = read_asset(asset).decode('utf-8', errors='ignore')
+        signatures = {name: dom_signature(rewrite(text)) for name, (rewrite, _) in html_rewriters.items()}
+        reference = signatures['lxml']
+        for name, signature in signatures.items():
+            if signature != reference:
+                mismatches.append((asset['rel_path'], name))
+                print(f"Rewriter mismatch: {asset['rel_path']} ({name} differs from lxml)")
+    print(f"Checked rewriters on {root_path}: {len(mismatches)} mismatches")
+    return mismatches
+
+def read_asset(asset):
+    with open(asset['path'], 'rb') as f:
+        data = f.read()
+    asset['hash'] = hashlib.sha256(data).hexdigest()
+    return data
+
+def apply_transform(transform, data):
+    # Runs in pool workers, so it must stay a picklable module-level function
+    return transform(data.decode('utf-8', errors='ignore'))
+
+def iter_transformed(cache, assets, namespace, version, transform, workers, executor=None, job=None):
+    # Yield the transformed text of each asset in manifest order. Cache misses
+    # go to a process pool, but only a few files are read or in flight at
+    # once, so memory stays proportional to the largest file. A stage that
+    # transforms several groups of files passes its own executor to share
+    # one pool; job(asset) gives a (version, transform) pair for files whose
+    # output depends on more than their contents.
+    workers = min(workers, len(assets))
+    max_in_flight = max(workers, 1) * 2
+    # A shared pool serves the whole build, so even a single file goes to it
+    parallel = workers > 1 or executor is not None
+    own_executor = None
+    in_flight = collections.deque()
+
+    def finish(asset, asset_version, future, text):
+        if future is not None:
+            text = future.result()
+            if cache is not None:
+                cache.put(namespace, asset_version, asset['hash'], text.encode('utf-8'))
+        return text
+
+    try:
+        for asset in assets:
+            asset_version, asset_transform = job(asset) if job is not None else (version, transform)
+            data = read_asset(asset)
+            cached = cache.get(namespace, asset_version, asset['hash']) if cache is not None else None
+            if cached is not None:
+                in_flight.append((asset, asset_version, None, cached.decode('utf-8')))
+            elif parallel:
+                if executor is None:
+                    executor = own_executor = ProcessPoolExecutor(max_workers=workers)
+                in_flight.append((asset, asset_version, executor.submit(apply_transform, asset_transform, data), None))
+            else:
+                text = apply_transform(asset_transform, data)
+                if cache is not None:
+                    cache.put(namespace, asset_version, asset['hash'], text.encode('utf-8'))
+                in_flight.append((asset, asset_version, None, text))
+            del data
+            while len(in_flight) > max_in_flight:
+                yield finish(*in_flight.popleft())
+        while in_flight:
+            yield finish(*in_flight.popleft())
+    finally:
+        if own_executor is not None:
+            own_executor.shutdown()
+
+class WorkerPool:
+    # A ProcessPoolExecutor shared by every stage of a build and started on
+    # the first submit, so builds served from the cache start no processes
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.executor = None
+
+    def submit(self, fn, *args):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self.executor.submit(fn, *args)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+def write_bundle(cache, assets, namespace, version, transform, bundle_path, separator, workers,
+                 on_output=None, finish=None, executor=None):
+    # Write each file's transformed output straight into the bundle through a
+    # buffered writer instead of building the whole bundle in memory
+    # tracemalloc slows allocation-heavy minifiers down about tenfold and
+    # forked pool workers would inherit it, so it only runs when asked for
+    # and only for serial builds
+    tracing = trace_bundle_memory and workers <= 1 and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    rss_before = peak_rss_bytes()
+
+    with open(bundle_path, 'w', encoding='utf-8', newline='', buffering=1024 * 1024) as f:
+        outputs = iter_transformed(cache, assets, namespace, version, transform, workers, executor)
+        for index, (asset, text) in enumerate(zip(assets, outputs)):
+            if finish is not None:
+                # Uncached step applied to each file's cached output
+                text = finish(asset, text)
+            if index:
+                if namespace == 'css':
+                    text = strip_charset(text)
+                f.write(separator)
+            f.write(text)
+            if on_output is not None:
+                on_output(asset, text)
+
+    # ru_maxrss only ever grows, so this is the peak of the whole process;
+    # the increase is how far writing this bundle raised it
+    memory = ''
+    rss_after = peak_rss_bytes()
+    if rss_after is not None:
+        memory = (f", process peak RSS so far {rss_after / (1024 * 1024):.1f} MB"
+                  f" (raised {(rss_after - rss_before) / (1024 * 1024):.1f} MB by this bundle)")
+    if tracing:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        memory += f", traced peak {peak / (1024 * 1024):.1f} MB"
+    written = os.path.getsize(bundle_path)
+    print(f"Wrote {os.path.basename(bundle_path)}: {len(assets)} files, {written} bytes{memory}")
+
+def peak_rss_bytes():
+    # Peak resident memory of this process so far, None where the resource
+    # module is missing (Windows)
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+# Attributes and CSS constructs that point at other files
+reference_attr_re = re.compile(
+    r'(?<![\w:-])(?P<attr>href|src|srcset|poster|data|background|xlink:href)\s*=\s*'
+    r'(?P<value>"[^"]*"|\'[^\']*\'|[^\s>]+)', re.I)
+css_reference_re = re.compile(
+    r'url\(\s*(?P<url>"[^"]*"|\'[^\']*\'|[^)]*?)\s*\)|@import\s+(?P<import>"[^"]*"|\'[^\']*\')', re.I)
+url_scheme_re = re.compile(r'^[a-zA-Z][a-zA-Z0-9+.-]*:')
+
+def extract_references(text, base_dirs):
+    # Return the input-relative paths text may refer to, resolved against each base dir
+    refs = []
+    for match in reference_attr_re.finditer(text):
+        value = html_lib.unescape(match.group('value').strip('"\''))
+        if match.group('attr').lower() == 'srcset':
+            refs.extend(candidate.split()[0] for candidate in value.split(',') if candidate.strip())
+        else:
+            refs.append(value)
+    for match in css_reference_re.finditer(text):
+        refs.append((match.group('url') or match.group('import')).strip('"\''))
+
+    paths = set()
+    for ref in refs:
+        for base_dir in base_dirs:
+            path = resolve_reference(ref, base_dir)
+            if path is not None:
+                paths.add(path)
+    return paths
+
+def resolve_reference(ref, base_dir):
+    # Map a local URL to a path relative to the input folder, or None for
+    # external, fragment-only and out-of-tree references
+    ref = ref.strip()
+    if not ref or ref.startswith(('#', '//')) or url_scheme_re.match(ref):
+        return None
+    ref = urllib.parse.unquote(ref.split('#')[0].split('?')[0])
+    if not ref:
+        return None
+    if ref.startswith('/'):
+        path = posixpath.normpath(ref.lstrip('/'))
+    else:
+        path = posixpath.normpath(posixpath.join(base_dir, ref))
+    if path == '..' or path.startswith('../'):
+        return None
+    return path
+
+def prune_unreferenced(assets, references, keep_patterns):
+    # Keep assets reachable from the pages and stylesheets (following
+    # references inside SVG files) plus anything matching keep_patterns
+    by_path = {}
+    for asset in assets:
+        by_path[asset['rel_path'].replace(os.sep, '/')] = asset
+        if asset['kind'] == 'mp3':
+            # .mp3 files are moved to the top level
+            by_path.setdefault(asset['name'], asset)
+
+    pending = [path for path in references if path in by_path]
+    pending.extend(path for path, asset in by_path.items()
+                   if matches_any(asset['name'], path, keep_patterns))
+    reachable = set()
+    while pending:
+        path = pending.pop()
+        asset = by_path[path]
+        if id(asset) in reachable:
+            continue
+        reachable.add(id(asset))
+        if asset['name'].lower().endswith('.svg'):
+            with open(asset['path'], 'rb') as f:
+                text = f.read().decode('utf-8', errors='ignore')
+            pending.extend(ref for ref in extract_references(text, [posixpath.dirname(path)])
+                           if ref in by_path)
+
+    kept = [asset for asset in assets if id(asset) in reachable]
+    pruned = [asset for asset in assets if id(asset) not in reachable]
+    print(f"Dead asset elimination: kept {len(kept)} assets, dropped {len(pruned)} "
+          f"({sum(a['size'] for a in pruned)} bytes saved)")
+    for asset in sorted(pruned, key=lambda a: a['size'], reverse=True)[:20]:
+        print(f"  dropped {asset['rel_path']} ({asset['size']} bytes)")
+    if len(pruned) > 20:
+        print(f"  ... and {len(pruned) - 20} more")
+    return kept
+
+# Top-level CSS tokens: strings and comments (skipped whole), braces and semicolons
+css_token_re = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|/\*.*?(?:\*/|\Z)|[{};]', re.S)
+# At-rules whose block holds ordinary rules that can be pruned too
+css_grouping_rules = ('media', 'supports', 'document', '-moz-document', 'layer', 'container')
+# Elements browsers add to every document even when the markup leaves them out
+implied_html_tags = {'html', 'head', 'body', 'tbody'}
+
+def css_statements(text):
+    # Yield (prelude, body, raw) for each top-level statement of a stylesheet.
+    # body is None for @import/@charset statements and comments.
+    depth = 0
+    start = 0
+    body_start = None
+    for token in css_token_re.finditer(text):
+        value = token.group()
+        if value.startswith('/*'):
+            if depth == 0 and not text[start:token.start()].strip():
+                yield value, None, text[start:token.end()]
+                start = token.end()
+        elif value == '{':
+            if depth == 0:
+                body_start = token.end()
+            depth += 1
+        elif value == '}':
+            if depth == 0:
+                continue
+            depth -= 1
+            if depth == 0:
+                yield text[start:body_start - 1], text[body_start:token.start()], text[start:token.end()]
+                start = token.end()
+        elif value == ';' and depth == 0:
+            yield text[start:token.start()], None, text[start:token.end()]
+            start = token.end()
+    if text[start:].strip():
+        # Unterminated statement: keep it as it is
+        yield text[start:], None, text[start:]
+
+def split_selector_list(prelude):
+    # Split "a,b:is(c,d)" on the commas that separate selectors
+    selectors = []
+    depth = 0
+    start = 0
+    quote = None
+    for index, char in enumerate(prelude):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            selectors.append(prelude[start:index])
+            start = index + 1
+    selectors.append(prelude[start:])
+    return selectors
+
+class CssPruner:
+    # Removes rules that cannot match any page. It is conservative: attribute
+    # selectors, pseudo-classes and their arguments are ignored, so a selector
+    # is dropped only when it names a tag, class or id found on no page.
+
+    def __init__(self, safelist):
+        self.safelist = safelist
+        self.used = {'tag': set(implied_html_tags), 'class': set(), 'id': set()}
+        self.rules_before = 0
+        self.rules_after = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+
+    def collect_html(self, text):
+        for token in html_token_re.finditer(text):
+            name = token.group('raw') or token.group('name')
+            if not name:
+                continue
+            self.used['tag'].add(name.lower())
+            attrs = parse_tag_attrs(token.group('raw_attrs') if token.group('raw') else token.group('attrs'))
+            if 'class' in attrs:
+                self.used['class'].update(attr_value(attrs['class']).split())
+            if 'id' in attrs:
+                self.used['id'].add(attr_value(attrs['id']).strip())
+
+    def is_used(self, kind, name):
+        return name in self.used[kind] or any(fnmatch.fnmatchcase(name, pattern) for pattern in self.safelist)
+
+    def may_match(self, selector):
+        # Hex escapes are rare; keep such selectors rather than decode them
+        if re.search(r'\\[0-9a-fA-F]', selector):
+            return True
+        simple = re.sub(r'\[[^\]]*\]', '', selector)
+        while True:
+            # Drop pseudo-class arguments, innermost first
+            stripped = re.sub(r'\([^()]*\)', '', simple)
+            if stripped == simple:
+                break
+            simple = stripped
+        simple = re.sub(r'(?<!\\)::?(?:\\.|[\w-])+', '', simple)
+        for match in re.finditer(r'([.#]?)((?:\\.|[\w-]|[^\x00-\x7f])+)', simple):
+            prefix, name = match.groups()
+            name = re.sub(r'\\(.)', r'\1', name)
+            if prefix == '.':
+                kind = 'class'
+            elif prefix == '#':
+                kind = 'id'
+            else:
+                kind = 'tag'
+                name = name.lower()
+            if not self.is_used(kind, name):
+                return False
+        return True
+
+    def prune(self, text):
+        self.bytes_before += len(text.encode('utf-8'))
+        result = self.prune_rules(text)
+        self.bytes_after += len(result.encode('utf-8'))
+        return result
+
+    def prune_rules(self, text):
+        out = []
+        for prelude, body, raw in css_statements(text):
+            if body is None:
+                out.append(raw)
+                continue
+            at_rule = re.match(r'\s*@([\w-]+)', prelude)
+            if at_rule:
+                if at_rule.group(1).lower() in css_grouping_rules:
+                    inner = self.prune_rules(body)
+                    if inner.strip():
+                        out.append(f"{prelude}{{{inner}}}")
+                else:
+                    # @font-face, @keyframes, @page, ... are kept whole
+                    out.append(raw)
+                continue
+            self.rules_before += 1
+            selectors = split_selector_list(prelude)
+            kept = [selector for selector in selectors if self.may_match(selector)]
+            if not kept:
+                continue
+            self.rules_after += 1
+            out.append(raw if len(kept) == len(selectors) else f"{','.join(kept)}{{{body}}}")
+        return ''.join(out)
+
+    def report(self):
+        print(f"Unused CSS pruning: {self.rules_before} -> {self.rules_after} rules, "
+              f"{self.bytes_before} -> {self.bytes_after} bytes")
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def find_duplicates(items):
+    # Map the key of every (key, path, size) item whose file repeats an
+    # earlier item's bytes to that earlier key. Only files sharing a size and
+    # an extension are hashed, so unique files are never read.
+    groups = collections.defaultdict(list)
+    for key, path, size in items:
+        groups[(os.path.splitext(key)[1].lower(), size)].append((key, path))
+    duplicates = {}
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        first = {}
+        for key, path in group:
+            digest = file_digest(path)
+            if digest in first:
+                duplicates[key] = first[digest]
+            else:
+                first[digest] = key
+    return duplicates
+
+def staged_rel_path(asset):
+    # .mp3 files go to the top level, other assets keep their directory structure
+    return asset['name'] if asset['kind'] == 'mp3' else asset['rel_path']
+
+class AssetDeduplicator:
+    # Finds staged assets whose contents repeat an earlier asset's, so only
+    # the first copy is bundled, and points page and stylesheet references
+    # at that copy. Files matching keep_patterns are never dropped, as
+    # scripts may load them by name.
+
+    def __init__(self, assets, keep_patterns):
+        by_path = {asset['rel_path']: asset for asset in assets}
+        candidates = [(asset['rel_path'], asset['path'], asset['size']) for asset in assets]
+        self.duplicates = {}
+        for rel_path, original in find_duplicates(candidates).items():
+            asset = by_path[rel_path]
+            if not matches_any(asset['name'], rel_path.replace(os.sep, '/'), keep_patterns):
+                self.duplicates[rel_path] = by_path[original]
+        self.saved = sum(by_path[rel_path]['size'] for rel_path in self.duplicates)
+        self.urls = {rel_path.replace(os.sep, '/'): urllib.parse.quote(staged_rel_path(original).replace(os.sep, '/'))
+                     for rel_path, original in self.duplicates.items()}
+        self.rewritten = 0
+
+    def is_duplicate(self, asset):
+        return asset['rel_path'] in self.duplicates
+
+    def new_url(self, ref, base_dirs):
+        for base_dir in base_dirs:
+            path = resolve_reference(ref, base_dir)
+            if path in self.urls:
+                self.rewritten += 1
+                suffix = re.search(r'[?#].*', ref.strip())
+                return self.urls[path] + (suffix.group() if suffix else '')
+        return None
+
+    def rewrite_css(self, text, base_dirs):
+        if not self.urls:
+            return text
+        return rewrite_css_urls(text, lambda ref: self.new_url(ref, base_dirs))
+
+    def rewrite_page(self, text, base_dirs):
+        if not self.urls:
+            return text
+        return rewrite_page_urls(text, lambda ref: self.new_url(ref, base_dirs),
+                                 lambda tag: ('src', 'srcset', 'poster', 'href', 'data'))
+
+    def report(self, report):
+        report.info['dedupe'] = {'duplicates': len(self.duplicates), 'bytes_saved': self.saved,
+                                 'references_rewritten': self.rewritten}
+        print(f"Deduplicated assets: {len(self.duplicates)} copies of identical files left out "
+              f"({self.saved} bytes saved, {self.rewritten} references rewritten)")
+
+def rewrite_css_urls(text, new_url):
+    # Replace each url() reference for which new_url(ref) returns a URL.
+    # Data URIs and percent-encoded paths need no quoting, which keeps style
+    # attributes readable.
+    def replace(match):
+        if match.group('url') is None:
+            return match.group()
+        url = new_url(match.group('url').strip('"\''))
+        return f'url({url})' if url else match.group()
+    return css_reference_re.sub(replace, text)
+
+def rewrite_page_urls(text, new_url, url_attrs):
+    # Replace URLs in the attributes url_attrs(tag name) lists, in style
+    # attributes and in <style> elements wherever new_url(ref) returns one
+    out = []
+    pos = 0
+    for token in html_token_re.finditer(text):
+        raw = (token.group('raw') or '').lower()
+        if raw == 'style':
+            start = token.end('raw_attrs') + 1
+            closing = re.search(r'</style\s*>\Z', token.group(), re.I)
+            end = token.start() + closing.start() if closing else token.end()
+            out.append(text[pos:start])
+            out.append(rewrite_css_urls(text[start:end], new_url))
+            pos = end
+            continue
+        if raw or not token.group('name'):
+            continue
+        attr_text = token.group('attrs')
+        attrs = parse_tag_attrs(attr_text)
+        new_attrs = attr_text
+        for name in url_attrs(token.group('name').lower()):
+            if name not in attrs:
+                continue
+            value = attr_value(attrs[name])
+            if name == 'srcset':
+                candidates = []
+                for candidate in value.split(','):
+                    words = candidate.split()
+                    url = new_url(words[0]) if words else None
+                    candidates.append(' '.join([url] + words[1:]) if url else candidate.strip())
+                url = ', '.join(candidates)
+                if url == ', '.join(candidate.strip() for candidate in value.split(',')):
+                    url = None
+            else:
+                url = new_url(value)
+            if url:
+                new_attrs = set_tag_attr(new_attrs, parse_tag_attrs(new_attrs), name, html_lib.escape(url))
+        if 'style' in attrs:
+            style = attr_value(attrs['style'])
+            rewritten = rewrite_css_urls(style, new_url)
+            if rewritten != style:
+                new_attrs = set_tag_attr(new_attrs, parse_tag_attrs(new_attrs), 'style',
+                                         html_lib.escape(rewritten))
+        if new_attrs != attr_text:
+            out.append(text[pos:token.start('attrs')])
+            out.append(new_attrs)
+            pos = token.end('attrs')
+    out.append(text[pos:])
+    return ''.join(out)
+
+class AssetInliner:
+    # Replaces references to small images and fonts with data URIs, so pages
+    # need fewer separate loads through the resource loader
+
+    def __init__(self, manifest, limit):
+        self.by_path = {}
+        for asset in assets_of_kind(manifest, 'asset'):
+            mime = web_mime_types.get(os.path.splitext(asset['name'])[1].lower()) or mimetypes.guess_type(asset['name'])[0]
+            if asset['size'] <= limit and mime and mime.split('/')[0] in ('image', 'font'):
+                self.by_path[asset['rel_path'].replace(os.sep, '/')] = (asset, mime)
+        self.data_uris = {}
+        self.inlined = 0
+
+    def data_uri(self, ref, base_dirs):
+        for base_dir in base_dirs:
+            path = resolve_reference(ref, base_dir)
+            if path in self.by_path:
+                break
+        else:
+            return None
+        if path not in self.data_uris:
+            asset, mime = self.by_path[path]
+            with open(asset['path'], 'rb') as f:
+                data = base64.b64encode(f.read()).decode('ascii')
+            self.data_uris[path] = f"data:{mime};base64,{data}"
+        self.inlined += 1
+        return self.data_uris[path]
+
+    def inline_css(self, text, base_dirs):
+        return rewrite_css_urls(text, lambda ref: self.data_uri(ref, base_dirs))
+
+    def inline_page(self, text, base_dirs):
+        return rewrite_page_urls(text, lambda ref: self.data_uri(ref, base_dirs),
+                                 lambda tag: ('src', 'poster', 'href') if tag == 'link' else ('src', 'poster'))
+
+    def report(self):
+        size = sum(len(uri) for uri in self.data_uris.values())
+        print(f"Inlined {len(self.data_uris)} small images and fonts as data URIs "
+              f"({self.inlined} references, {size} bytes of data URIs)")
+
+def inline_critical_css(html, temp_dir, css_texts, fold_bytes, safelist):
+    # Inline the rules needed by the top of the page ahead of its stylesheets
+    # and let the stylesheets load without blocking first paint
+    links = []
+    for token in html_token_re.finditer(html):
+        if (token.group('name') or '').lower() != 'link':
+            continue
+        attrs = parse_tag_attrs(token.group('attrs'))
+        if 'rel' not in attrs or 'stylesheet' not in attr_value(attrs['rel']).split() or 'media' in attrs:
+            continue
+        href = resolve_reference(attr_value(attrs['href']) if 'href' in attrs else '', '')
+        if href is None or not os.path.isfile(os.path.join(temp_dir, href)):
+            continue
+        if href not in css_texts:
+            with open(os.path.join(temp_dir, href), encoding='utf-8', errors='ignore') as f:
+                css_texts[href] = f.read()
+        links.append((token, attrs, href))
+    if not links:
+        return html
+
+    # Names used in the head and the first fold_bytes of the body
+    body = re.search(r'<body\b', html, re.I)
+    pruner = CssPruner(safelist)
+    pruner.collect_html(html[:(body.start() if body else 0) + fold_bytes])
+    hrefs = list(dict.fromkeys(href for _, _, href in links))
+    critical = ''.join(pruner.prune_rules(css_texts[href]) for href in hrefs)
+
+    out = [html[:links[0][0].start()]]
+    if critical:
+        out.append(f"<style>{critical}</style>")
+    pos = links[0][0].start()
+    for token, attrs, href in links:
+        attr_text = token.group('attrs')
+        attr_text = set_tag_attr(attr_text, attrs, 'media', 'print')
+        attr_text = set_tag_attr(attr_text, parse_tag_attrs(attr_text), 'onload', "this.media='all'")
+        out.append(html[pos:token.start('attrs')])
+        out.append(attr_text)
+        out.append(html[token.end('attrs'):token.end()])
+        out.append(f'<noscript>{token.group()}</noscript>')
+        pos = token.end()
+    out.append(html[pos:])
+    return ''.join(out)
+
+def cpu_time():
+    # CPU seconds used by this process and by child processes that have
+    # exited (pool workers, PyInstaller subprocesses); Windows reports no children
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+class BuildReport:
+    # Wall time, CPU time, files and bytes per build stage. Progress for the
+    # file stages follows the bytes processed out of the scanned total; the
+    # report is written as build-report.json next to the executable.
+
+    def __init__(self, progress=None):
+        self.progress = progress or (lambda value: None)
+        self.started = time.time()
+        self.started_clock = time.perf_counter()
+        self.started_cpu = cpu_time()
+        self.stages = []
+        self.local = threading.local()
+        self.info = {}
+        self.total_bytes = 0
+        self.done_bytes = 0
+        self.last_progress = None
+        # Latest PyInstaller step, and whether the site files are done so
+        # that steps may move the progress past 50
+        self.pyinstaller_step = None
+        self.files_done = False
+        self.phase_lock = threading.Lock()
+
+    @property
+    def open_stages(self):
+        # Stages nest per thread, so a background PyInstaller run is not
+        # recorded inside the stage the main thread is in
+        if not hasattr(self.local, 'open_stages'):
+            self.local.open_stages = []
+        return self.local.open_stages
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        # Nested stages are recorded as "outer/inner"
+        record = {'name': '/'.join([stage['name'] for stage in self.open_stages] + [name]),
+                  'files': 0, 'bytes': 0}
+        self.open_stages.append(record)
+        started, started_cpu = time.perf_counter(), cpu_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = round(time.perf_counter() - started, 4)
+            record['cpu_seconds'] = round(cpu_time() - started_cpu, 4)
+            self.open_stages.pop()
+            self.stages.append(record)
+
+    def add(self, asset):
+        # Count one processed file towards the innermost stage and the progress
+        if self.open_stages:
+            self.open_stages[-1]['files'] += 1
+            self.open_stages[-1]['bytes'] += asset['size']
+        self.done_bytes += asset['size']
+        if self.total_bytes:
+            self.set_progress(min(50, 50 * self.done_bytes // self.total_bytes))
+
+    def set_progress(self, value):
+        if value != self.last_progress:
+            self.last_progress = value
+            self.progress(value)
+
+    def files_processed(self):
+        self.set_progress(50)
+        with self.phase_lock:
+            self.files_done = True
+        # Catch up with a PyInstaller run that got ahead in the background
+        self.pyinstaller_phase(self.pyinstaller_step)
+
+    def pyinstaller_phase(self, name):
+        # Also called from the log of an overlapped PyInstaller run in its
+        # thread. Its steps only show once the files are processed, as
+        # progress never moves back.
+        with self.phase_lock:
+            self.pyinstaller_step = name
+            value = pyinstaller_progress.get(name)
+            if self.files_done and value is not None and value > (self.last_progress or 0):
+                self.set_progress(value)
+
+    def write(self, path, builder):
+        executable_path = builder.executable_path
+        report = {
+            'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+            'wall_seconds': round(time.perf_counter() - self.started_clock, 4),
+            'cpu_seconds': round(cpu_time() - self.started_cpu, 4),
+            'executable': executable_path,
+            'executable_bytes': os.path.getsize(executable_path) if executable_path and os.path.exists(executable_path) else None,
+            'files': len(builder.asset_manifest or []),
+            'bytes': self.total_bytes,
+            'config': vars(builder.config),
+            'toolchain': toolchain_versions(),
+            'stages': self.stages,
+        }
+        report.update(self.info)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Build took {report['wall_seconds']:.2f}s; slowest stages: " + ", ".join(
+            f"{stage['name']} {stage['wall_seconds']:.2f}s"
+            for stage in sorted(self.stages, key=lambda stage: stage['wall_seconds'], reverse=True)[:5]))
+        print(f"Build report written to {path}")
+
+class PyInstallerPhases(logging.Handler):
+    # Times PyInstaller's build targets from its log, where every target
+    # logs "checking <Target>" as it starts
+
+    def __init__(self, on_phase=None):
+        super().__init__(logging.INFO)
+        self.on_phase = on_phase or (lambda name: None)
+        self.phases = []
+        self.phase_started = None
+        self.start_phase('startup')
+
+    def start_phase(self, name):
+        now = time.perf_counter()
+        if self.phases:
+            self.phases[-1]['wall_seconds'] = round(now - self.phase_started, 4)
+        self.phase_started = now
+        if name is not None:
+            self.phases.append({'name': name})
+            self.on_phase(name)
+
+    def emit(self, record):
+        self.feed(record.getMessage())
+
+    def feed(self, message):
+        match = re.search(r'\bchecking (Analysis|PYZ|PKG|EXE|COLLECT)\b', message)
+        if match:
+            self.start_phase(match.group(1))
+
+    def finish(self):
+        self.start_phase(None)
+        return self.phases
+
+class BuildCache:
+    # On-disk store of transformed file contents. Entries are plain files named
+    # by a hash of (stage, tool version, source hash); reading an entry bumps
+    # its mtime so prune() can evict least recently used entries first.
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def entry_path(self, namespace, version, content_hash):
+        key = hashlib.sha256(f"{namespace}:{version}:{content_hash}".encode('utf-8')).hexdigest()
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, namespace, version, content_hash):
+        path = self.entry_path(namespace, version, content_hash)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data
+
+    def put(self, namespace, version, content_hash, data):
+        path = self.entry_path(namespace, version, content_hash)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a private file first so concurrent builds never see partial entries
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write build cache entry: {e}")
+
+    def prune(self):
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.root):
+            for file in files:
+                path = os.path.join(root, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+class DigestMemo:
+    # SHA-256 digests of files by path, kept on disk between builds. An entry
+    # is reused only while the file's size, mtime, inode and ctime all match;
+    # ctime changes on every write and cannot be set back like mtime can.
+
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.hashed_bytes = 0
+        self.used = {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+        if not isinstance(self.entries, dict):
+            self.entries = {}
+
+    def digest(self, file_path):
+        file_path = os.path.abspath(file_path)
+        st = os.stat(file_path)
+        identity = [st.st_size, st.st_mtime_ns, st.st_ino, st.st_ctime_ns]
+        entry = self.entries.get(file_path)
+        if isinstance(entry, list) and len(entry) == 5 and entry[:4] == identity:
+            self.hits += 1
+            file_hash = entry[4]
+        else:
+            file_hash = file_digest(file_path)
+            self.hashed_bytes += st.st_size
+        self.used[file_path] = identity + [file_hash]
+        return file_hash
+
+    def save(self):
+        # Keep entries of other sites whose files still exist
+        entries = {path: entry for path, entry in self.entries.items()
+                   if path not in self.used and os.path.exists(path)}
+        entries.update(self.used)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Could not save file digests: {e}")
+
+class ArtifactCache:
+    # On-disk store of finished executables, without their trailer, by
+    # Builder.artifact_key(). Each entry is a folder holding the executable
+    # and its payload entry; restoring one bumps its mtime so prune() evicts
+    # least recently used builds first.
+
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def get(self, key, dest_path):
+        # Copy the stored executable to dest_path and return its metadata, or None
+        entry_dir = os.path.join(self.root, key)
+        try:
+            with open(os.path.join(entry_dir, 'artifact.json'), encoding='utf-8') as f:
+                entry = json.load(f)
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            shutil.copyfile(os.path.join(entry_dir, 'executable'), dest_path)
+            shutil.copymode(os.path.join(entry_dir, 'executable'), dest_path)
+            os.utime(entry_dir)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def put(self, key, exe_path, payload):
+        entry_dir = os.path.join(self.root, key)
+        # Fill a private folder first so concurrent builds never see partial entries
+        tmp_dir = f"{entry_dir}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(tmp_dir, exist_ok=True)
+            shutil.copyfile(exe_path, os.path.join(tmp_dir, 'executable'))
+            shutil.copymode(exe_path, os.path.join(tmp_dir, 'executable'))
+            with open(os.path.join(tmp_dir, 'artifact.json'), 'w', encoding='utf-8') as f:
+                json.dump({'payload': payload}, f)
+            os.replace(tmp_dir, entry_dir)
+        except OSError as e:
+            # Also reached when another build stored the same key first
+            if not os.path.isdir(entry_dir):
+                print(f"Could not write artifact cache entry: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def prune(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            entry_dir = os.path.join(self.root, name)
+            if name.endswith('.tmp') or not os.path.isdir(entry_dir):
+                continue
+            size = 0
+            for file in os.listdir(entry_dir):
+                try:
+                    size += os.path.getsize(os.path.join(entry_dir, file))
+                except OSError:
+                    continue
+            entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+            total += size
+        entries.sort()
+        for _, size, entry_dir in entries:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= size
+
+def asset_kind(file_name):
+    if file_name.endswith('.css'):
+        return 'css'
+    if file_name.endswith('.js'):
+        return 'js'
+    if file_name.endswith('.html'):
+        return 'html'
+    if file_name.endswith('.mp3'):
+        return 'mp3'
+    return 'asset'
+
+def matches_any(name, rel_path, patterns):
+    # Patterns match either the bare file/folder name or the path relative to the input folder
+    return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(rel_path, pattern) for pattern in patterns)
+
+def scan_assets(root_path, include=None, exclude=None):
+    # Walk the tree once with os.scandir, keeping os.walk's top-down order, and
+    # prune excluded folders before descending into them
+    if exclude is None:
+        exclude = default_exclude_patterns
+    manifest = []
+    pending_dirs = [root_path]
+    while pending_dirs:
+        current_dir = pending_dirs.pop()
+        try:
+            with os.scandir(current_dir) as it:
+                entries = list(it)
+        except OSError as e:
+            print(f"Skipping unreadable folder {current_dir}: {e}")
+            continue
+
+        sub_dirs = []
+        for entry in entries:
+            rel_path = os.path.relpath(entry.path, root_path).replace(os.sep, '/')
+            if matches_any(entry.name, rel_path, exclude):
+                continue
+            if entry.is_dir():
+                # Like os.walk, do not follow symlinked folders
+                if not entry.is_symlink():
+                    sub_dirs.append(entry.path)
+                continue
+            if include and not matches_any(entry.name, rel_path, include):
+                continue
+            stat = entry.stat()
+            manifest.append({
+                'path': entry.path,
+                'rel_path': os.path.normpath(rel_path),
+                'name': entry.name,
+                'kind': asset_kind(entry.name),
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'hash': None,
+            })
+        pending_dirs.extend(reversed(sub_dirs))
+    return manifest
+
+def assets_of_kind(manifest, *kinds):
+    return [asset for asset in manifest if asset['kind'] in kinds]
+
+def run_pyinstaller(args, in_subprocess=False, on_phase=None):
+    # Returns the time spent in each of PyInstaller's build steps
+    if importlib.util.find_spec('PyInstaller') is None:
+        raise RuntimeError("PyInstaller not found. Please install it with: pip install pyinstaller")
+    phases = PyInstallerPhases(on_phase)
+    if in_subprocess:
+        # Pass the log through while watching it for step changes
+        process = subprocess.Popen([sys.executable, '-m', 'PyInstaller', *args],
+                                   stderr=subprocess.PIPE, universal_newlines=True)
+        for line in process.stderr:
+            sys.stderr.write(line)
+            phases.feed(line)
+        if process.wait():
+            raise subprocess.CalledProcessError(process.returncode, process.args)
+    else:
+        import PyInstaller.__main__ as pyi_main
+        logger = logging.getLogger('PyInstaller')
+        logger.addHandler(phases)
+        try:
+            pyi_main.run(args)
+        finally:
+            logger.removeHandler(phases)
+    return phases.finish()
+
+# The runner is identical for every build; per-build values such as the
+# expiry are read at runtime from the trailer appended to the executable.
+# Keeping the script byte-for-byte stable lets PyInstaller reuse its previous
+# analysis.
+runner_script = """
+import time
+STARTED = time.time()
 import sys
 import os
-import time
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+import zipfile
 from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QMessageBox
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-from PyQt5.QtCore import QUrl
+from PyQt5.QtWebEngineWidgets import QWebEngineView, QWebEnginePage, QWebEngineProfile, QWebEngineSettings
+from PyQt5.QtWebEngineCore import QWebEngineUrlScheme, QWebEngineUrlSchemeHandler, QWebEngineUrlRequestJob
+from PyQt5.QtCore import QUrl, QIODevice, QStandardPaths, QTimer
+
+def peak_rss():
+    # Peak resident memory of this process in bytes, where the OS reports it
+    try:
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+        class MemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage')]
+        counters = MemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    except (ImportError, OSError, AttributeError):
+        pass
+    return None
+
+class StartupTrace:
+    # Opt-in startup timing. Set WEBAPP_STARTUP_TRACE to a file path (or "-"
+    # for stdout) to get one JSON line with the time each startup step
+    # finished and the peak memory once index.html has loaded.
+    # WEBAPP_TRACE_LAUNCH is the launcher's time.time() when it started the
+    # process; WEBAPP_EXIT_AFTER_LOAD=1 quits after the first load, or
+    # WEBAPP_EXIT_DELAY seconds later.
+    def __init__(self):
+        self.target = os.environ.get('WEBAPP_STARTUP_TRACE')
+        self.exit_after_load = os.environ.get('WEBAPP_EXIT_AFTER_LOAD') == '1'
+        self.exit_delay = float(os.environ.get('WEBAPP_EXIT_DELAY') or 0)
+        self.runtime_profile = None
+        self.marks = {}
+        self.done = False
+        launch = os.environ.get('WEBAPP_TRACE_LAUNCH')
+        if launch:
+            self.marks['launch'] = float(launch)
+        # The script starts running once the bootloader has unpacked the bundle
+        self.marks['bootloader_done'] = STARTED
+
+    def mark(self, name):
+        if self.target and name not in self.marks:
+            self.marks[name] = time.time()
+
+    def load_finished(self, ok):
+        if not self.target or self.done:
+            return
+        self.done = True
+        self.mark('load_finished')
+        start = self.marks.get('launch', STARTED)
+        record = {
+            'pid': os.getpid(),
+            'ok': ok,
+            'marks': self.marks,
+            'ms_since_start': {name: round((value - start) * 1000, 1) for name, value in self.marks.items()},
+            'peak_rss_bytes': peak_rss(),
+            'runtime_profile': self.runtime_profile,
+        }
+        line = json.dumps(record) + '\\n'
+        if self.target == '-':
+            if sys.stdout is not None:
+                sys.stdout.write(line)
+                sys.stdout.flush()
+        else:
+            with open(self.target, 'a', encoding='utf-8') as f:
+                f.write(line)
+        if self.exit_after_load:
+            QTimer.singleShot(int(self.exit_delay * 1000), QApplication.instance().quit)
+
+startup_trace = StartupTrace()
+startup_trace.mark('imports_done')
+
+PAYLOAD_MAGIC = b'H2EPAYLD'
+
+def read_trailer():
+    # Every build appends its settings to the executable, and instant and pack
+    # builds the site too: [runner][payload][json header][header length][magic]
+    try:
+        with open(sys.executable, 'rb') as f:
+            f.seek(-16, os.SEEK_END)
+            header_length, magic = struct.unpack('<Q8s', f.read(16))
+            if magic != PAYLOAD_MAGIC:
+                return None
+            f.seek(-16 - header_length, os.SEEK_END)
+            return json.loads(f.read(header_length).decode('utf-8'))
+    except (OSError, ValueError, struct.error):
+        return None
+
+class PayloadFile:
+    # Read-only file object over the payload's byte range of the executable
+    def __init__(self, path, offset, length):
+        self.file = open(path, 'rb')
+        self.offset = offset
+        self.length = length
+        self.pos = 0
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, pos, whence=0):
+        if whence == 1:
+            pos += self.pos
+        elif whence == 2:
+            pos += self.length
+        self.pos = max(0, min(pos, self.length))
+        return self.pos
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.length - self.pos
+        size = min(size, self.length - self.pos)
+        self.file.seek(self.offset + self.pos)
+        data = self.file.read(size)
+        self.pos += len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+def user_cache_dir():
+    # Per-user folder for unpacked sites; a shared temp folder would let
+    # another user plant files for the app to load
+    if sys.platform == 'win32':
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    elif sys.platform == 'darwin':
+        base = os.path.expanduser('~/Library/Caches')
+    else:
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, 'html_to_exe')
+
+def owned_privately(path):
+    # The folder belongs to this user and nobody else can write to it
+    if not hasattr(os, 'getuid'):
+        return True
+    info = os.lstat(path)
+    return info.st_uid == os.getuid() and not info.st_mode & 0o022
+
+def extraction_complete(target, sha256):
+    # The marker is written last and lists every file with its size, so a
+    # folder cut short or partly deleted is unpacked again
+    try:
+        with open(os.path.join(target, '.complete'), encoding='utf-8') as f:
+            marker = json.load(f)
+        if marker['sha256'] != sha256:
+            return False
+        for rel_path, size in marker['files'].items():
+            if os.path.getsize(os.path.join(target, rel_path)) != size:
+                return False
+    except (OSError, ValueError, KeyError, TypeError, AttributeError):
+        return False
+    os.utime(os.path.join(target, '.complete'))
+    return True
+
+def unpack_payload(payload, dest):
+    payload_file = PayloadFile(sys.executable, payload['offset'], payload['length'])
+    try:
+        with zipfile.ZipFile(payload_file) as archive:
+            archive.extractall(dest)
+            files = {info.filename: info.file_size for info in archive.infolist() if not info.is_dir()}
+    finally:
+        payload_file.close()
+    with open(os.path.join(dest, '.complete'), 'w', encoding='utf-8') as f:
+        json.dump({'sha256': payload['sha256'], 'files': files}, f)
+
+def remove_stale_extractions(cache_dir, keep, max_age=30 * 86400):
+    # Sites unpacked by builds not launched for a month
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if not name.startswith('webapp-') or path == keep:
+            continue
+        try:
+            marker = os.path.join(path, '.complete')
+            last_used = os.path.getmtime(marker if os.path.exists(marker) else path)
+        except OSError:
+            continue
+        if time.time() - last_used > max_age:
+            shutil.rmtree(path, ignore_errors=True)
+
+def extract_payload(payload):
+    # Unpack the site once per payload into the user's cache folder; later
+    # launches reuse it after checking its owner and completion marker
+    cache_dir = user_cache_dir()
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        if not owned_privately(cache_dir):
+            raise OSError(f"{cache_dir} is not private to this user")
+    except OSError as e:
+        # Unpack into a new private folder for this launch only
+        print(f"Cannot use {cache_dir}: {e}")
+        import atexit
+        target = tempfile.mkdtemp(prefix='webapp-')
+        atexit.register(shutil.rmtree, target, True)
+        unpack_payload(payload, target)
+        return target
+
+    target = os.path.join(cache_dir, 'webapp-' + payload['sha256'][:16])
+    if os.path.isdir(target) and owned_privately(target) and extraction_complete(target, payload['sha256']):
+        return target
+    partial = tempfile.mkdtemp(prefix='webapp-', suffix='.tmp', dir=cache_dir)
+    try:
+        unpack_payload(payload, partial)
+        if os.path.lexists(target):
+            # Incomplete, or not ours: replace it
+            if os.path.isdir(target) and not os.path.islink(target):
+                shutil.rmtree(target, ignore_errors=True)
+            else:
+                os.remove(target)
+        os.replace(partial, target)
+    except OSError:
+        # Another instance finished first
+        shutil.rmtree(partial, ignore_errors=True)
+        if not (os.path.isdir(target) and owned_privately(target) and extraction_complete(target, payload['sha256'])):
+            raise
+    try:
+        remove_stale_extractions(cache_dir, target)
+    except OSError:
+        pass
+    return target
+
+PACK_MAGIC = b'H2EPACK1'
+PACK_SCHEME = b'webapp'
+
+class SitePack:
+    # Site files stored back to back after a path -> [offset, length, mime]
+    # index. The executable is memory-mapped, so a file's bytes are only read
+    # when the page requests it and nothing is extracted to disk.
+    def __init__(self, path, offset):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.map[offset:offset + 8] != PACK_MAGIC:
+            raise ValueError("not a site pack")
+        index_length = struct.unpack_from('<Q', self.map, offset + 8)[0]
+        self.index = json.loads(self.map[offset + 16:offset + 16 + index_length].decode('utf-8'))
+        self.data_start = offset + 16 + index_length
+
+    def get(self, path):
+        return self.index.get(path)
+
+class PackFileDevice(QIODevice):
+    # One file of the pack as a random-access device. Reads are served from
+    # the memory map as QtWebEngine asks for data, so a request for part of
+    # a large video only touches those pages of the executable.
+    def __init__(self, pack, entry, parent=None):
+        super().__init__(parent)
+        self.map = pack.map
+        self.start = pack.data_start + entry[0]
+        self.length = entry[1]
+        self.end = self.length
+
+    def select_range(self, first, last):
+        # Serve bytes first..last (inclusive) of the file
+        self.end = last + 1
+        self.seek(first)
+
+    def isSequential(self):
+        return False
+
+    def size(self):
+        return self.length
+
+    def bytesAvailable(self):
+        return max(0, self.end - self.pos())
+
+    def readData(self, max_size):
+        position = self.pos()
+        count = max(0, min(max_size, self.end - position))
+        return self.map[self.start + position:self.start + position + count]
+
+    def writeData(self, data):
+        return -1
+
+def parse_range(header, length):
+    # (first, last) for a single "bytes=first-last", "bytes=first-" or
+    # "bytes=-suffix" range, with first > last when it lies past the end.
+    # None for headers to ignore (other units, several ranges, bad syntax).
+    unit, _, spec = header.strip().partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, _, last = spec.strip().partition('-')
+    try:
+        if not first:
+            suffix = int(last)
+            return (max(0, length - suffix), length - 1) if suffix > 0 and length else None
+        first = int(first)
+        last = int(last) if last else length - 1
+    except ValueError:
+        return None
+    if first < 0 or last < first and last != length - 1:
+        return None
+    return first, min(last, length - 1)
+
+def request_range(job):
+    # Value of the request's Range header, or None (requestHeaders() is Qt 5.15+)
+    if hasattr(job, 'requestHeaders'):
+        for name, value in job.requestHeaders().items():
+            if bytes(name).lower() == b'range':
+                return bytes(value).decode('latin-1')
+    return None
+
+class PackSchemeHandler(QWebEngineUrlSchemeHandler):
+    def __init__(self, pack, parent=None):
+        super().__init__(parent)
+        self.pack = pack
+
+    def requestStarted(self, job):
+        path = job.requestUrl().path(QUrl.FullyDecoded).lstrip('/')
+        if not path or path.endswith('/'):
+            path += 'index.html'
+        entry = self.pack.get(path)
+        if entry is None:
+            job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+            return
+        device = PackFileDevice(self.pack, entry, job)
+        # Unbuffered, as the map already is the buffer
+        device.open(QIODevice.ReadOnly | QIODevice.Unbuffered)
+        # Media elements seek with Range requests. QtWebEngine positions the
+        # reply device for a single range as well; seeking is absolute, so
+        # doing it here too is harmless and keeps seeking working either way.
+        header = request_range(job)
+        if header is not None:
+            byte_range = parse_range(header, entry[1])
+            if byte_range is not None:
+                if byte_range[0] > byte_range[1]:
+                    job.fail(QWebEngineUrlRequestJob.RequestFailed)
+                    return
+                device.select_range(*byte_range)
+        job.reply(entry[2].encode('ascii'), device)
+
+def register_pack_scheme():
+    # Must happen before the QApplication is created
+    scheme = QWebEngineUrlScheme(PACK_SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+    scheme.setFlags(QWebEngineUrlScheme.SecureScheme | QWebEngineUrlScheme.LocalAccessAllowed
+                    | QWebEngineUrlScheme.CorsEnabled)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+def open_site():
+    # Returns (site folder, site pack); exactly one of them is set
+    payload = trailer.get('payload') if trailer else None
+    if payload and payload['format'] == 'pack':
+        return None, SitePack(sys.executable, payload['offset'])
+    if payload:
+        return extract_payload(payload), None
+    if hasattr(sys, '_MEIPASS'):
+        return sys._MEIPASS, None
+    return os.path.abspath("."), None
+
+trailer = read_trailer()
+site_dir, site_pack = open_site()
+startup_trace.mark('site_opened')
 
 def resource_path(relative_path):
-    if hasattr(sys, '_MEIPASS'):
-        return os.path.join(sys._MEIPASS, relative_path)
-    return os.path.join(os.path.abspath("."), relative_path)
+    return os.path.join(site_dir, relative_path)
+
+def load_app_config():
+    # {} when the trailer is missing or malformed; check_expiry() refuses to start then
+    if isinstance(trailer, dict) and isinstance(trailer.get('config'), dict):
+        return trailer['config']
+    return {}
 
 def check_expiry():
-    creation_time = {creation_time}
-    expiry_seconds = {expiry_seconds}
-    if expiry_seconds is not None:
+    app_config = load_app_config()
+    creation_time = app_config.get('creation_time')
+    expiry_seconds = app_config.get('expiry_seconds')
+    # Every build appends these settings, so a packaged app without them has
+    # been cut short or altered and must not run as if it never expired.
+    # Running main_script.py directly has no trailer to read.
+    valid = (isinstance(creation_time, (int, float)) and 'expiry_seconds' in app_config
+             and (expiry_seconds is None or isinstance(expiry_seconds, (int, float))))
+    if not valid and getattr(sys, 'frozen', False):
+        QMessageBox.critical(None, "Damaged", "This application is damaged and cannot start.")
+        sys.exit(1)
+    if valid and expiry_seconds is not None:
         current_time = time.time()
         if current_time > creation_time + expiry_seconds:
             QMessageBox.critical(None, "Expired", "This application has expired.")
             sys.exit(1)
 
+# Chromium flags and web settings for each runtime profile. 'low-memory' is
+# for machines where the app shares little RAM with other software: every
+# page shares one renderer process, rasterization stays on the CPU, and
+# features a packaged site rarely needs are off.
+runtime_profiles = {
+    'default': {'chromium_flags': [], 'disabled_settings': [], 'http_cache_max_bytes': None},
+    'low-memory': {
+        'chromium_flags': [
+            '--renderer-process-limit=1', '--process-per-site',
+            '--enable-low-end-device-mode', '--disable-gpu-rasterization', '--num-raster-threads=1',
+            '--disable-background-networking', '--disable-features=SpareRendererForSitePerProcess,BackForwardCache',
+            '--js-flags=--optimize-for-size',
+        ],
+        'disabled_settings': ['WebGLEnabled', 'Accelerated2dCanvasEnabled', 'PluginsEnabled',
+                              'PdfViewerEnabled', 'ScrollAnimatorEnabled'],
+        'http_cache_max_bytes': 16 * 1024 * 1024,
+    },
+}
+
+def runtime_profile_name():
+    name = os.environ.get('WEBAPP_RUNTIME_PROFILE') or load_app_config().get('runtime_profile') or 'default'
+    if name not in runtime_profiles:
+        print(f"Unknown runtime profile {name!r}, using the default one")
+        name = 'default'
+    return name
+
+def apply_chromium_flags(name):
+    # QtWebEngine reads the flags when it starts, so this has to run before
+    # the QApplication is created. Flags the user already set come last and win.
+    flags = runtime_profiles[name]['chromium_flags']
+    if flags:
+        os.environ['QTWEBENGINE_CHROMIUM_FLAGS'] = ' '.join(flags + [os.environ.get('QTWEBENGINE_CHROMIUM_FLAGS', '')]).strip()
+
+def apply_web_settings(profile, name):
+    runtime = runtime_profiles[name]
+    settings = profile.settings()
+    for attribute in runtime['disabled_settings']:
+        # Some attributes only exist in newer Qt versions
+        if hasattr(QWebEngineSettings, attribute):
+            settings.setAttribute(getattr(QWebEngineSettings, attribute), False)
+    # A cache size chosen at build time takes precedence
+    if runtime['http_cache_max_bytes'] and not load_app_config().get('web_cache'):
+        profile.setHttpCacheMaximumSize(runtime['http_cache_max_bytes'])
+
+def create_profile(app):
+    # Builds made with a web cache size get a named, persistent profile: its
+    # HTTP cache (with the V8 code cache Chromium keeps for http(s) scripts)
+    # lives in a folder per build, while cookies and local storage are kept
+    # across builds
+    settings = load_app_config().get('web_cache')
+    if not settings:
+        return QWebEngineProfile.defaultProfile()
+    base_dir = QStandardPaths.writableLocation(QStandardPaths.AppLocalDataLocation) or tempfile.gettempdir()
+    app_dir = os.path.join(base_dir, 'webapp-' + settings['app_id'])
+    cache_dir = os.path.join(app_dir, 'cache-' + settings['build_id'])
+    # Caches of earlier builds of this app would never be read again
+    try:
+        for name in os.listdir(app_dir):
+            if name.startswith('cache-') and os.path.join(app_dir, name) != cache_dir:
+                shutil.rmtree(os.path.join(app_dir, name), ignore_errors=True)
+    except OSError:
+        pass
+    profile = QWebEngineProfile('webapp', app)
+    profile.setPersistentStoragePath(os.path.join(app_dir, 'storage'))
+    profile.setCachePath(cache_dir)
+    profile.setHttpCacheType(QWebEngineProfile.DiskHttpCache)
+    profile.setHttpCacheMaximumSize(settings['max_bytes'])
+    return profile
+
 class WebAppWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, profile):
         super().__init__()
         self.setWindowTitle('Web Application')
         self.setGeometry(100, 100, 1200, 800)
@@ -191,9 +2679,18 @@ class WebAppWindow(QMainWindow):
         
         # Create web view
         self.web_view = QWebEngineView()
+        self.web_view.setPage(QWebEnginePage(profile, self.web_view))
+        self.web_view.loadFinished.connect(startup_trace.load_finished)
         layout.addWidget(self.web_view)
         
         # Load the HTML file
+        if site_pack is not None:
+            if site_pack.get('index.html') is not None:
+                self.web_view.load(QUrl(PACK_SCHEME.decode('ascii') + '://app/index.html'))
+            else:
+                self.web_view.setHtml("<h1>Error: index.html not found</h1>")
+            return
+
         index_path = resource_path('index.html')
         if os.path.exists(index_path):
             file_url = QUrl.fromLocalFile(os.path.abspath(index_path))
@@ -202,23 +2699,284 @@ class WebAppWindow(QMainWindow):
             self.web_view.setHtml("<h1>Error: index.html not found</h1>")
 
 if __name__ == '__main__':
-    check_expiry()
+    runtime_profile = runtime_profile_name()
+    startup_trace.runtime_profile = runtime_profile
+    apply_chromium_flags(runtime_profile)
+    if site_pack is not None:
+        register_pack_scheme()
     app = QApplication(sys.argv)
-    window = WebAppWindow()
+    startup_trace.mark('qapplication_created')
+    # The expiry message box needs the QApplication
+    check_expiry()
+    profile = create_profile(app)
+    apply_web_settings(profile, runtime_profile)
+    if site_pack is not None:
+        pack_handler = PackSchemeHandler(site_pack, app)
+        profile.installUrlSchemeHandler(PACK_SCHEME, pack_handler)
+    window = WebAppWindow(profile)
     window.show()
-    
-    sys.exit(app.exec_())
-""".format(
-    creation_time=time.time(),
-    expiry_seconds="None" if expiry_seconds is None else str(expiry_seconds)
-)
-
-    script_path = os.path.join(temp_dir, 'main_script.py')
-    with open(script_path, 'w') as f:
-        f.write(script_content)
-    return script_path
-
-def generate_license():
+    startup_trace.mark('window_shown')
+
+    exit_code = app.exec_()
+    # Pages have to be deleted before the profile they use
+    del window
+    sys.exit(exit_code)
+"""
+
+# Spec used for every build. Analysis only sees the runner script, and the
+# site files are added to the bundle afterwards, so a change to the site does
+# not invalidate the cached Analysis and PYZ steps.
+runner_spec = """
+# Generated by html_to_exe.py
+import json
+import os
+import time
+
+a = Analysis([{script_path!r}], pathex=[], binaries=[], datas=[], hiddenimports=[],
+             hookspath=[], runtime_hooks=[], excludes=[], noarchive=False)
+pyz = PYZ(a.pure)
+
+# The converter may still be processing the site; it writes the file list
+# (or null if processing failed) once the site is ready. Give up if the
+# converter goes away (it started this process) or never writes it.
+parent_pid = os.getppid()
+deadline = time.time() + {timeout}
+while not os.path.exists({datas_path!r}):
+    if os.getppid() != parent_pid or time.time() > deadline:
+        raise SystemExit("Gave up waiting for the site files")
+    time.sleep(0.1)
+with open({datas_path!r}, encoding='utf-8') as f:
+    site_datas = json.load(f)
+if site_datas is None:
+    raise SystemExit("Site processing failed")
+site_datas = [tuple(entry) for entry in site_datas]
+
+exe = EXE(pyz, a.scripts, a.binaries, getattr(a, 'zipfiles', []), a.datas + site_datas, [],
+          name={app_name!r}, debug=False, strip=False, upx=True, console=False,
+          icon={icon_path!r})
+"""
+
+def write_if_changed(path, content):
+    # Leave an identical file untouched so its mtime does not trigger a rebuild
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            if f.read() == content:
+                return path
+    except OSError:
+        pass
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return path
+
+def create_main_script(work_dir):
+    return write_if_changed(os.path.join(work_dir, 'main_script.py'), runner_script)
+
+def make_app_config(config, build_id):
+    # Per-build settings read by the runner at startup. They go in the
+    # trailer rather than the bundled files, so everything before the trailer
+    # only depends on the build inputs and can be cached.
+    app_config = {'creation_time': time.time(), 'expiry_seconds': config.expiry_seconds,
+                  'runtime_profile': config.runtime_profile}
+    if config.web_cache_mb:
+        app_config['web_cache'] = {
+            # The same for every build of a site, so a new build finds and
+            # discards the caches of the ones before it
+            'app_id': hashlib.sha256(f"{config.app_name}\0{config.input_path}".encode('utf-8')).hexdigest()[:16],
+            'build_id': build_id[:16],
+            'max_bytes': config.web_cache_mb * 1024 * 1024,
+        }
+    return app_config
+
+def site_datas(temp_dir, staged_data):
+    # PyInstaller TOC entries (dest, source, 'DATA') for every file in temp_dir
+    # plus the assets that were left in place
+    datas = []
+    for root, _, files in os.walk(temp_dir):
+        for file in files:
+            src = os.path.join(root, file)
+            datas.append((os.path.relpath(src, temp_dir), src, 'DATA'))
+    for src, dest in staged_data:
+        datas.append((os.path.normpath(os.path.join(dest, os.path.basename(src))), src, 'DATA'))
+    return datas
+
+def write_site_datas(datas_path, datas):
+    # Written whole under the final name, as a waiting spec reads it as soon as it exists
+    tmp_path = f"{datas_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(datas, f)
+    os.replace(tmp_path, datas_path)
+
+def write_site_zip(zip_path, datas):
+    # Fixed timestamps and sorted entries keep the archive reproducible
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for dest, src, _ in sorted(datas):
+            info = zipfile.ZipInfo(dest.replace(os.sep, '/'), date_time=(1980, 1, 1, 0, 0, 0))
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            with open(src, 'rb') as fsrc, archive.open(info, 'w') as fdst:
+                shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+
+def write_site_pack(pack_path, datas):
+    # Pack layout read by the runner's SitePack: magic, index length, JSON
+    # index of path -> [offset, length, mime], then the file contents.
+    # Files with identical contents are stored once and share an offset.
+    # Returns the number of bytes saved that way.
+    entries = sorted((dest.replace(os.sep, '/'), src, os.path.getsize(src)) for dest, src, _ in datas)
+    duplicates = find_duplicates(entries)
+    index = {}
+    offset = 0
+    saved = 0
+    for dest, src, size in entries:
+        extension = os.path.splitext(dest)[1].lower()
+        mime = web_mime_types.get(extension) or mimetypes.guess_type(dest)[0] or 'application/octet-stream'
+        if dest in duplicates:
+            index[dest] = [index[duplicates[dest]][0], size, mime]
+            saved += size
+            continue
+        index[dest] = [offset, size, mime]
+        offset += size
+    index_bytes = json.dumps(index, sort_keys=True).encode('utf-8')
+    with open(pack_path, 'wb') as pack:
+        pack.write(pack_magic + struct.pack('<Q', len(index_bytes)) + index_bytes)
+        for dest, src, _ in entries:
+            if dest not in duplicates:
+                with open(src, 'rb') as f:
+                    shutil.copyfileobj(f, pack, 1024 * 1024)
+    return saved
+
+def print_pack_savings(saved):
+    if saved:
+        print(f"Site pack: stored files with identical contents once ({saved} bytes saved)")
+
+def append_payload(exe_path, payload_path, payload_format='zip'):
+    # Append the payload and return its trailer entry. Returns None if the
+    # payload contains the marker PyInstaller's bootloader looks for, as the
+    # bootloader could then pick the wrong archive.
+    digest = hashlib.sha256()
+    tail = b''
+    with open(exe_path, 'ab') as exe, open(payload_path, 'rb') as payload:
+        offset = exe.tell()
+        length = 0
+        while True:
+            chunk = payload.read(1024 * 1024)
+            if not chunk:
+                break
+            if pyinstaller_magic in tail + chunk:
+                return None
+            tail = chunk[-(len(pyinstaller_magic) - 1):]
+            digest.update(chunk)
+            exe.write(chunk)
+            length += len(chunk)
+    return {'format': payload_format, 'offset': offset, 'length': length, 'sha256': digest.hexdigest()}
+
+def append_trailer(exe_path, payload, app_config):
+    # The trailer read by the runner's read_trailer(): a JSON header with the
+    # payload (None for plain PyInstaller builds) and the app config, its
+    # length and a magic marker
+    header = json.dumps({'payload': payload, 'config': app_config}).encode('utf-8')
+    with open(exe_path, 'ab') as exe:
+        exe.write(header)
+        exe.write(struct.pack('<Q8s', len(header), payload_magic))
+
+def toolchain_versions():
+    import PyInstaller
+    from PyQt5.QtCore import PYQT_VERSION_STR
+    return {'python': sys.version, 'python_executable': sys.executable, 'platform': sys.platform,
+            'pyinstaller': PyInstaller.__version__, 'pyqt': PYQT_VERSION_STR}
+
+def toolchain_key():
+    # Changes whenever something that PyInstaller's cached analysis depends on does
+    versions = toolchain_versions()
+    parts = [versions[name] for name in ('python', 'python_executable', 'platform', 'pyinstaller', 'pyqt')]
+    return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+def prune_runner_stubs(cache_dir, max_bytes, keep):
+    # Remove the least recently used stub folders of every toolchain until the
+    # rest fit in max_bytes, never the stub in keep. Partial stub folders left
+    # by builds that were killed are removed after a day.
+    entries = []
+    total = 0
+    for toolchain_dir in glob.glob(os.path.join(cache_dir, '*')):
+        for stub_dir in glob.glob(os.path.join(toolchain_dir, 'stub-*')):
+            try:
+                mtime = os.path.getmtime(stub_dir)
+            except OSError:
+                continue
+            if stub_dir.endswith('.tmp'):
+                if time.time() - mtime > 86400:
+                    shutil.rmtree(stub_dir, ignore_errors=True)
+                continue
+            size = 0
+            for root, _, files in os.walk(stub_dir):
+                for file in files:
+                    try:
+                        size += os.path.getsize(os.path.join(root, file))
+                    except OSError:
+                        continue
+            total += size
+            if os.path.abspath(stub_dir) != os.path.abspath(keep):
+                entries.append((mtime, size, stub_dir))
+    entries.sort()
+    for _, size, stub_dir in entries:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(stub_dir, ignore_errors=True)
+        total -= size
+
+def process_alive(pid):
+    # Whether a process with this id is running on this machine
+    if sys.platform == 'win32':
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            # Access denied still means the process exists
+            return kernel32.GetLastError() == 5
+        try:
+            exit_code = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+            return exit_code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def lock_owner_gone(lock_path):
+    # The lock records "<host> <pid>"; only a process on this host can be checked
+    import socket
+    try:
+        with open(lock_path, encoding='utf-8') as f:
+            host, _, pid = f.read().strip().rpartition(' ')
+        return host == socket.gethostname() and not process_alive(int(pid))
+    except (OSError, ValueError):
+        return False
+
+def acquire_lock(lock_path, stale_after=6 * 3600):
+    import socket
+    for _ in range(2):
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            # A lock left behind by a killed build is taken over at once,
+            # and one whose owner cannot be checked after a while
+            try:
+                if lock_owner_gone(lock_path) or time.time() - os.path.getmtime(lock_path) > stale_after:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            return False
+        os.write(fd, f"{socket.gethostname()} {os.getpid()}".encode('utf-8'))
+        os.close(fd)
+        return True
+    return False
+
+def generate_license(output_path):
     license_content = """
 This software is provided "as is" without warranty of any kind, express or implied.
 Unauthorized distribution or modification is prohibited.
@@ -603,24 +3361,24 @@ Exhibit B - "Incompatible With Secondary Licenses" Notice
         f.write(license_content)
     print(f"License file created at: {license_path}")
 
-def cleanup():
-    shutil.rmtree(temp_dir)
+def default_output_path():
+    # Output directory named after the current date and time
+    current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(script_dir, f"output_{current_time}")
 
 def select_input():
-    global input_path, output_path, temp_dir
+    global input_path, output_path
     input_path = QFileDialog.getExistingDirectory(None, "Select Input Directory")
     if input_path:
         input_label.setText(f"Input: {input_path}")
         
         # Create output directory based on current date and time
-        current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_path = os.path.join(script_dir, f"output_{current_time}")
+        output_path = default_output_path()
         os.makedirs(output_path, exist_ok=True)
         
-        temp_dir = os.path.join(output_path, 'temp')
-        
         output_label.setText(f"Output: {output_path}")
         convert_button.setEnabled(True)
+        preview_button.setEnabled(True)
 
 
 def start_conversion():
@@ -630,7 +3388,9 @@ def start_conversion():
         return
 
     expiry_selection = expiry_combo.currentText()
-    conversion_thread = ConversionThread(expiry_selection)
+    config = BuildConfig(input_path, output_path, expiry_seconds=expiry_options[expiry_selection],
+                         **gui_build_options)
+    conversion_thread = ConversionThread(config)
     conversion_thread.progress.connect(update_progress)
     conversion_thread.finished.connect(conversion_finished)
     conversion_thread.error.connect(conversion_error)
@@ -650,68 +3410,488 @@ def conversion_error(error_message):
     QMessageBox.critical(None, "Error", f"An error occurred: {error_message}")
     convert_button.setEnabled(True)
 
-# Main application
-app = QApplication(sys.argv)
-window = QMainWindow()
-window.setWindowTitle("HTML to EXE Converter")
-window.setGeometry(100, 100, 400, 300)
+def toggle_preview():
+    global watch_thread, preview_dir
+    if watch_thread and watch_thread.isRunning():
+        stop_preview()
+        return
+    if not input_path:
+        QMessageBox.warning(None, "Error", "Please select an input directory.")
+        return
+
+    # Build the site into a scratch folder and rebuild changed files as they are saved
+    preview_dir = tempfile.mkdtemp(prefix='html_to_exe_preview_')
+    watch_thread = WatchThread(BuildConfig(input_path, preview_dir, **gui_build_options))
+    watch_thread.rebuilt.connect(preview_rebuilt)
+    watch_thread.error.connect(preview_error)
+    watch_thread.start()
+
+    preview_button.setText("Stop Live Preview")
+    preview_view.show()
+    window.resize(1100, 800)
+
+def preview_rebuilt(temp_dir):
+    # Reload the page being previewed, or open index.html after the first build
+    current = preview_view.url()
+    if current.isLocalFile() and current.toLocalFile().startswith(temp_dir):
+        preview_view.reload()
+        return
+    index_path = os.path.join(temp_dir, 'index.html')
+    if os.path.exists(index_path):
+        preview_view.load(QUrl.fromLocalFile(index_path))
+    else:
+        preview_view.setHtml("<h1>Error: index.html not found</h1>")
+
+def preview_error(error_message):
+    QMessageBox.critical(None, "Error", f"Live preview failed: {error_message}")
+    stop_preview()
+
+def stop_preview():
+    global watch_thread, preview_dir
+    if watch_thread:
+        watch_thread.stop()
+        watch_thread.wait()
+        watch_thread = None
+    if preview_dir:
+        shutil.rmtree(preview_dir, ignore_errors=True)
+        preview_dir = None
+    preview_button.setText("Start Live Preview")
+    preview_view.hide()
 
-# Set the window icon
-icon_path = os.path.join(script_dir, 'icon.jpg')
-if os.path.exists(icon_path):
-    app_icon = QIcon(icon_path)
-    window.setWindowIcon(app_icon)
-    app.setWindowIcon(app_icon)
+def closeEvent(event):
+    global conversion_thread
+    if conversion_thread and conversion_thread.isRunning():
+        conversion_thread.wait()
+    stop_preview()
+    event.accept()
 
-layout = QVBoxLayout()
+def parse_expiry(text):
+    # Accept the GUI labels ("1 day"), "lifetime", or a number with a unit ("1d", "12h")
+    for label, seconds in expiry_options.items():
+        if text.lower() == label.lower():
+            return seconds
+    if text.lower() in ('lifetime', 'never', 'none'):
+        return None
+    match = re.fullmatch(r'(\d+)\s*([a-z]+)', text.strip().lower())
+    if not match or match.group(2) not in expiry_units:
+        raise ValueError(f"unknown expiry: {text}")
+    return int(match.group(1)) * expiry_units[match.group(2)]
+
+def build_arg_parser():
+    # Options shared by the GUI and the build command. SUPPRESS keeps a
+    # subcommand from overwriting options given before it.
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--no-cache', action='store_true', default=argparse.SUPPRESS, help="rebuild every file instead of reusing the build cache")
+    common.add_argument('--workers', type=int, default=argparse.SUPPRESS, help="worker processes used for minification and HTML rewriting")
+    common.add_argument('--rewriter', choices=sorted(html_rewriters), default=argparse.SUPPRESS, help="HTML rewriter backend")
+    common.add_argument('--instant', action='store_true', default=argparse.SUPPRESS, help="append the site to a prebuilt runner instead of running PyInstaller")
+    common.add_argument('--pack', action='store_true', default=argparse.SUPPRESS, help="serve the site from a memory-mapped pack instead of extracted files")
+    common.add_argument('--prune-assets', action='store_true', default=argparse.SUPPRESS, help="leave out assets no page or stylesheet references")
+    common.add_argument('--keep', action='append', default=argparse.SUPPRESS, help="glob of assets to keep when pruning or deduplicating, e.g. files loaded by scripts (repeatable)")
+    common.add_argument('--bundle', choices=['global', 'page'], default=argparse.SUPPRESS, help="one CSS/JS bundle for the site, or per-page bundles with shared chunks")
+    common.add_argument('--common-min-pages', type=int, default=argparse.SUPPRESS, help="with --bundle page, files used by this many pages go into shared chunks (default 2)")
+    common.add_argument('--prune-css', action='store_true', default=argparse.SUPPRESS, help="drop CSS rules that match no tag, class or id used by the pages")
+    common.add_argument('--css-safelist', action='append', default=argparse.SUPPRESS, help="glob of class/id/tag names to keep when pruning CSS, e.g. names added by scripts (repeatable)")
+    common.add_argument('--inline-limit', type=int, default=argparse.SUPPRESS, help="embed images and fonts up to this many bytes as data URIs")
+    common.add_argument('--critical-css', action='store_true', default=argparse.SUPPRESS, help="inline each page's above-the-fold CSS and load stylesheets after first paint")
+    common.add_argument('--dedupe-assets', action='store_true', default=argparse.SUPPRESS, help="bundle identical assets once and point references to the copies at it")
+    common.add_argument('--web-cache-mb', type=int, default=argparse.SUPPRESS, help="give the app a persistent web profile with a disk cache of this many MB")
+    common.add_argument('--runtime-profile', choices=['default', 'low-memory'], default=argparse.SUPPRESS, help="Chromium flags and web settings the app starts with")
+    common.add_argument('--no-overlap', action='store_true', default=argparse.SUPPRESS, help="process the site before starting PyInstaller instead of alongside it")
+    common.add_argument('--staging', choices=['link', 'copy', 'direct'], default=argparse.SUPPRESS, help="how assets are staged for PyInstaller")
+
+    parser = argparse.ArgumentParser(description="HTML to EXE Converter", parents=[common])
+    commands = parser.add_subparsers(dest='command')
+
+    # What to build, shared by build and submit
+    target = argparse.ArgumentParser(add_help=False)
+    target.add_argument('src', help="website folder to convert")
+    target.add_argument('--expiry', type=parse_expiry, default=None, help="e.g. 1h, 1d, 2w, 6mo, 1y or lifetime (default)")
+    target.add_argument('--include', action='append', help="only convert files matching this glob (repeatable)")
+    target.add_argument('--exclude', action='append', default=[], help="skip files and folders matching this glob (repeatable)")
+    target.add_argument('--icon', default=default_icon_path, help="icon for the executable")
+    target.add_argument('--name', default='WebApp', help="name of the executable")
+
+    build = commands.add_parser('build', allow_abbrev=False, parents=[common, target], help="convert a website folder without the GUI")
+    build.add_argument('--out', help="output directory (default: output_<timestamp> next to this script)")
+
+    submit = commands.add_parser('submit', allow_abbrev=False, parents=[common, target], help="add a build to the queue run by serve and print its job id")
+    submit.add_argument('--out', help="output directory (default: output/<job id> in the queue folder)")
+    submit.add_argument('--queue', default=default_queue_dir, help="queue folder")
+
+    serve = commands.add_parser('serve', allow_abbrev=False, help="run queued builds in parallel worker processes")
+    serve.add_argument('--queue', default=default_queue_dir, help="queue folder")
+    serve.add_argument('--jobs', type=int, default=max(1, (os.cpu_count() or 1) // 4), help="builds to run at the same time (default: a quarter of the CPU cores)")
+    serve.add_argument('--interval', type=float, default=1.0, help="seconds between checks for new jobs")
+    serve.add_argument('--exit-when-idle', action='store_true', help="stop once the queue is empty instead of waiting for more jobs")
+
+    status = commands.add_parser('status', allow_abbrev=False, help="list the queued, running and finished builds")
+    status.add_argument('job', nargs='?', help="show one job's record and log path")
+    status.add_argument('--queue', default=default_queue_dir, help="queue folder")
+
+    watch = commands.add_parser('watch', allow_abbrev=False, parents=[common], help="build the site into a folder and rebuild changed files as they are saved")
+    watch.add_argument('src', help="website folder to watch")
+    watch.add_argument('--out', help="folder for the built site (default: a temporary folder)")
+    watch.add_argument('--interval', type=float, default=0.5, help="seconds between checks for changes")
+
+    check = commands.add_parser('check-rewriters', allow_abbrev=False, help="check that all HTML rewriters give equivalent pages and exit")
+    check.add_argument('src', help="website folder to check")
+    return parser
+
+def build_options_from_args(args):
+    options = {}
+    if getattr(args, 'no_cache', False):
+        options['use_cache'] = False
+    if getattr(args, 'workers', None):
+        options['workers'] = args.workers
+    if getattr(args, 'rewriter', None):
+        options['html_rewriter'] = args.rewriter
+    if getattr(args, 'staging', None):
+        options['staging_mode'] = args.staging
+    if getattr(args, 'instant', False):
+        options['instant'] = True
+    if getattr(args, 'pack', False):
+        options['pack_assets'] = True
+    if getattr(args, 'prune_assets', False):
+        options['prune_assets'] = True
+    if getattr(args, 'keep', None):
+        options['keep_patterns'] = args.keep
+    if getattr(args, 'bundle', None):
+        options['bundle_mode'] = args.bundle
+    if getattr(args, 'common_min_pages', None):
+        options['common_chunk_min_pages'] = args.common_min_pages
+    if getattr(args, 'prune_css', False):
+        options['prune_css'] = True
+    if getattr(args, 'css_safelist', None):
+        options['css_safelist'] = args.css_safelist
+    if getattr(args, 'inline_limit', None):
+        options['inline_limit'] = args.inline_limit
+    if getattr(args, 'critical_css', False):
+        options['critical_css'] = True
+    if getattr(args, 'dedupe_assets', False):
+        options['dedupe_assets'] = True
+    if getattr(args, 'no_overlap', False):
+        options['overlap_pyinstaller'] = False
+    if getattr(args, 'web_cache_mb', None):
+        options['web_cache_mb'] = args.web_cache_mb
+    if getattr(args, 'runtime_profile', None):
+        options['runtime_profile'] = args.runtime_profile
+    return options
+
+def build_kwargs_from_args(args, options):
+    # BuildConfig arguments of the build and submit commands, apart from the folders
+    return dict(expiry_seconds=args.expiry, include_patterns=args.include,
+                exclude_patterns=default_exclude_patterns + args.exclude,
+                icon_path=os.path.abspath(args.icon), app_name=args.name, **options)
+
+def cli_build(args, options):
+    config = BuildConfig(args.src, args.out or default_output_path(), **build_kwargs_from_args(args, options))
+    try:
+        executable_path = Builder(config).run(lambda value: print(f"Progress: {value}%"))
+    except Exception as e:
+        print(f"Build failed: {e}")
+        return 1
+    print(f"Executable created: {executable_path}")
+    return 0
+
+def write_job(path, job):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(job, f, indent=2)
+    os.replace(tmp_path, path)
+
+def job_path(queue_dir, state, job_id):
+    return os.path.join(queue_dir, state, job_id + '.json')
+
+def submit_job(queue_dir, src, out, options):
+    # Add a build to the queue. Job ids sort by submission time, which is the
+    # order serve_queue() picks them up in.
+    job_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}"
+    job = {
+        'id': job_id,
+        'src': os.path.abspath(src),
+        'out': os.path.abspath(out) if out else os.path.join(os.path.abspath(queue_dir), 'output', job_id),
+        'options': options,
+        'submitted': time.time(),
+    }
+    for state in queue_states + ('logs',):
+        os.makedirs(os.path.join(queue_dir, state), exist_ok=True)
+    write_job(job_path(queue_dir, 'queued', job_id), job)
+    return job
+
+def claim_job(queue_dir):
+    # Move the oldest queued job to running/. The rename fails for every
+    # server but one when several try to take the same job.
+    try:
+        names = sorted(name for name in os.listdir(os.path.join(queue_dir, 'queued')) if name.endswith('.json'))
+    except OSError:
+        return None
+    for name in names:
+        job_id = name[:-len('.json')]
+        try:
+            os.rename(job_path(queue_dir, 'queued', job_id), job_path(queue_dir, 'running', job_id))
+        except OSError:
+            continue
+        return job_id
+    return None
+
+def mark_job_server(queue_dir, job_id):
+    # Record which server claimed the job, so other servers know it is alive
+    import socket
+    path = job_path(queue_dir, 'running', job_id)
+    with open(path, encoding='utf-8') as f:
+        job = json.load(f)
+    job['host'] = socket.gethostname()
+    job['server_pid'] = os.getpid()
+    write_job(path, job)
+
+def job_orphaned(path, grace=60):
+    # A running job is orphaned when neither its server nor its worker runs
+    # any more. Jobs claimed on another host cannot be checked, and a job
+    # claimed moments ago may not have its server recorded yet.
+    import socket
+    try:
+        with open(path, encoding='utf-8') as f:
+            job = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if 'server_pid' not in job:
+        return time.time() - os.path.getmtime(path) > grace
+    if job.get('host') != socket.gethostname():
+        return False
+    return not any(process_alive(job[key]) for key in ('server_pid', 'pid') if job.get(key))
+
+def run_queued_job(queue_dir, job_id, workers):
+    # Runs in a fresh process per job, so every build has its own PyInstaller
+    # state and its output goes to the job's log
+    path = job_path(queue_dir, 'running', job_id)
+    with open(path, encoding='utf-8') as f:
+        job = json.load(f)
+    log = open(os.path.join(queue_dir, 'logs', job_id + '.log'), 'a', encoding='utf-8')
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+    job['started'] = time.time()
+    job['pid'] = os.getpid()
+    write_job(path, job)
+
+    options = dict(job['options'])
+    # Share the machine's cores between the builds running at the same time
+    options.setdefault('workers', workers)
+    try:
+        builder = Builder(BuildConfig(job['src'], job['out'], **options))
+        job['executable'] = builder.run(lambda value: print(f"Progress: {value}%", flush=True))
+        job['report'] = os.path.join(job['out'], 'build-report.json')
+    except Exception as e:
+        traceback.print_exc()
+        job['error'] = str(e) or type(e).__name__
+    sys.stdout.flush()
+    sys.stderr.flush()
+    write_job(path, job)
+    sys.exit(1 if 'error' in job else 0)
+
+def finish_job(queue_dir, job_id, exit_code):
+    path = job_path(queue_dir, 'running', job_id)
+    with open(path, encoding='utf-8') as f:
+        job = json.load(f)
+    job['finished'] = time.time()
+    job['exit_code'] = exit_code
+    if exit_code and 'error' not in job:
+        job['error'] = f"worker exited with code {exit_code}"
+    if 'started' in job:
+        job['wait_seconds'] = round(job['started'] - job['submitted'], 3)
+        job['build_seconds'] = round(job['finished'] - job['started'], 3)
+    state = 'failed' if exit_code else 'done'
+    write_job(job_path(queue_dir, state, job_id), job)
+    os.remove(path)
+    print(f"Job {job_id} {state} in {job.get('build_seconds', 0):.1f}s: {job.get('executable') or job['error']}")
+    return job
+
+def serve_queue(queue_dir, jobs, poll_interval=1.0, exit_when_idle=False):
+    # Run up to jobs builds at a time, each in its own process, until
+    # interrupted (or until the queue is empty with exit_when_idle)
+    for state in queue_states + ('logs',):
+        os.makedirs(os.path.join(queue_dir, state), exist_ok=True)
+    # Jobs whose server and worker are both gone never finished; run them
+    # again. Jobs of other servers sharing the queue are left alone.
+    for name in os.listdir(os.path.join(queue_dir, 'running')):
+        if name.endswith('.json') and job_orphaned(os.path.join(queue_dir, 'running', name)):
+            os.rename(os.path.join(queue_dir, 'running', name), os.path.join(queue_dir, 'queued', name))
+            print(f"Requeued interrupted job {name[:-len('.json')]}")
+
+    workers = max(1, (os.cpu_count() or 1) // jobs)
+    running = {}
+    print(f"Serving {os.path.abspath(queue_dir)} with {jobs} concurrent builds. Press Ctrl+C to stop.")
+    try:
+        while True:
+            for job_id, process in list(running.items()):
+                if not process.is_alive():
+                    process.join()
+                    finish_job(queue_dir, job_id, process.exitcode)
+                    del running[job_id]
+            while len(running) < jobs:
+                job_id = claim_job(queue_dir)
+                if job_id is None:
+                    break
+                print(f"Job {job_id} started")
+                mark_job_server(queue_dir, job_id)
+                process = multiprocessing.Process(target=run_queued_job, args=(queue_dir, job_id, workers))
+                process.start()
+                running[job_id] = process
+            if exit_when_idle and not running:
+                return 0
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        # The builds are killed with the server; the next serve requeues them
+        for process in running.values():
+            process.terminate()
+        return 0
+
+def queue_status(queue_dir):
+    # Every job in the queue, oldest first, with its state
+    jobs = []
+    for state in queue_states:
+        try:
+            names = os.listdir(os.path.join(queue_dir, state))
+        except OSError:
+            continue
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(queue_dir, state, name), encoding='utf-8') as f:
+                    job = json.load(f)
+            except (OSError, ValueError):
+                continue
+            job['state'] = state
+            jobs.append(job)
+    return sorted(jobs, key=lambda job: job['id'])
+
+def cli_submit(args, options):
+    if not os.path.isdir(args.src):
+        print(f"Not a folder: {args.src}")
+        return 1
+    job = submit_job(args.queue, args.src, args.out, build_kwargs_from_args(args, options))
+    print(job['id'])
+    return 0
+
+def cli_serve(args):
+    return serve_queue(args.queue, max(1, args.jobs), args.interval, args.exit_when_idle)
+
+def cli_status(args):
+    jobs = queue_status(args.queue)
+    if args.job:
+        jobs = [job for job in jobs if job['id'] == args.job]
+        if not jobs:
+            print(f"No job {args.job} in {args.queue}")
+            return 1
+        print(json.dumps(jobs[0], indent=2))
+        print(f"Log: {os.path.join(args.queue, 'logs', args.job + '.log')}")
+        return 0
+    print(f"{'job':<26}{'state':<9}{'wait s':>9}{'build s':>9}  site")
+    for job in jobs:
+        wait = f"{job['wait_seconds']:.1f}" if 'wait_seconds' in job else ''
+        build = f"{job['build_seconds']:.1f}" if 'build_seconds' in job else ''
+        print(f"{job['id']:<26}{job['state']:<9}{wait:>9}{build:>9}  {job['src']}")
+    counts = collections.Counter(job['state'] for job in jobs)
+    print(", ".join(f"{counts[state]} {state}" for state in queue_states))
+    return 0
+
+def cli_watch(args, options):
+    config = BuildConfig(args.src, args.out or tempfile.mkdtemp(prefix='html_to_exe_preview_'), **options)
+    watcher = SiteWatcher(Builder(config))
+    watcher.start()
+    print(f"Watching {config.input_path}; preview {os.path.join(config.temp_dir, 'index.html')}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(args.interval)
+            watcher.poll()
+    except KeyboardInterrupt:
+        return 0
 
-input_label = QLabel("Input: Not selected")
-layout.addWidget(input_label)
+if __name__ == "__main__":
+    # Qt adds its own arguments to the GUI's command line, but a mistyped
+    # option for a subcommand must not be silently ignored
+    parser = build_arg_parser()
+    args, _ = parser.parse_known_args()
+    if args.command is not None:
+        args = parser.parse_args()
+    gui_build_options = build_options_from_args(args)
+    if args.command == 'build':
+        sys.exit(cli_build(args, gui_build_options))
+    if args.command == 'watch':
+        sys.exit(cli_watch(args, gui_build_options))
+    if args.command == 'submit':
+        sys.exit(cli_submit(args, gui_build_options))
+    if args.command == 'serve':
+        sys.exit(cli_serve(args))
+    if args.command == 'status':
+        sys.exit(cli_status(args))
+    if args.command == 'check-rewriters':
+        sys.exit(1 if check_rewriters(args.src) else 0)
+
+    # The web engine module has to be imported before the QApplication is created
+    from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QFileDialog, QVBoxLayout, QWidget, QLabel, QProgressBar, QMessageBox, QComboBox # type: ignore
+    from PyQt5.QtCore import QUrl
+    from PyQt5.QtGui import QIcon
+    from PyQt5.QtWebEngineWidgets import QWebEngineView
+
+    # Main application
+    app = QApplication(sys.argv)
+    window = QMainWindow()
+    window.setWindowTitle("HTML to EXE Converter")
+    window.setGeometry(100, 100, 400, 300)
 
-output_label = QLabel("Output: Not selected")
-layout.addWidget(output_label)
+    # Set the window icon
+    icon_path = os.path.join(script_dir, 'icon.jpg')
+    if os.path.exists(icon_path):
+        app_icon = QIcon(icon_path)
+        window.setWindowIcon(app_icon)
+        app.setWindowIcon(app_icon)
 
-select_input_button = QPushButton("Select Website Folder to convert")
-select_input_button.clicked.connect(select_input)
-layout.addWidget(select_input_button)
+    layout = QVBoxLayout()
 
-convert_button = QPushButton("Convert")
-convert_button.clicked.connect(start_conversion)
-convert_button.setEnabled(False)
-layout.addWidget(convert_button)
+    input_label = QLabel("Input: Not selected")
+    layout.addWidget(input_label)
 
-progress_bar = QProgressBar()
-layout.addWidget(progress_bar)
+    output_label = QLabel("Output: Not selected")
+    layout.addWidget(output_label)
 
-expiry_options = {
-    "1 minutes": 60,
-    "1 hour": 3600,
-    "1 day": 86400,
-    "1 week": 604800,
-    "1 month": 2592000,
-    "1 year": 31536000,
-    "Lifetime": None
-}
+    select_input_button = QPushButton("Select Website Folder to convert")
+    select_input_button.clicked.connect(select_input)
+    layout.addWidget(select_input_button)
 
-expiry_label = QLabel("Select Expiry:")
-layout.addWidget(expiry_label)
+    convert_button = QPushButton("Convert")
+    convert_button.clicked.connect(start_conversion)
+    convert_button.setEnabled(False)
+    layout.addWidget(convert_button)
 
-expiry_combo = QComboBox()
-expiry_combo.addItems(expiry_options.keys())
-layout.addWidget(expiry_combo)
+    progress_bar = QProgressBar()
+    layout.addWidget(progress_bar)
 
-container = QWidget()
-container.setLayout(layout)
-window.setCentralWidget(container)
+    expiry_label = QLabel("Select Expiry:")
+    layout.addWidget(expiry_label)
 
-def closeEvent(event):
-    global conversion_thread
-    if conversion_thread and conversion_thread.isRunning():
-        conversion_thread.wait()
-    event.accept()
+    expiry_combo = QComboBox()
+    expiry_combo.addItems(expiry_options.keys())
+    layout.addWidget(expiry_combo)
 
-window.closeEvent = closeEvent
+    preview_button = QPushButton("Start Live Preview")
+    preview_button.clicked.connect(toggle_preview)
+    preview_button.setEnabled(False)
+    layout.addWidget(preview_button)
+
+    # Shows the site from the watch folder; reloaded after every rebuild
+    preview_view = QWebEngineView()
+    preview_view.hide()
+    layout.addWidget(preview_view, 1)
+
+    container = QWidget()
+    container.setLayout(layout)
+    window.setCentralWidget(container)
+
+    window.closeEvent = closeEvent
 
-if __name__ == "__main__":
     window.show()
     sys.exit(app.exec_())
\ No newline at end of file
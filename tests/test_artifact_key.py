@@ -0,0 +1,37 @@
+import collections
+import os
+
+import html_to_exe
+
+def artifact_key(site, cache_dir):
+    config = html_to_exe.BuildConfig(str(site), str(site.parent / 'out'), artifact_cache_dir=str(cache_dir))
+    return html_to_exe.Builder(config).artifact_key(collections.Counter())
+
+def test_media_replaced_with_same_size_and_mtime_changes_the_key(tmp_path):
+    site = tmp_path / 'site'
+    site.mkdir()
+    (site / 'index.html').write_text('<html><body><img src="a.png"></body></html>', encoding='utf-8')
+    media = site / 'a.png'
+    media.write_bytes(b'first image')
+    cache_dir = tmp_path / 'artifacts'
+
+    key, manifest = artifact_key(site, cache_dir)
+    assert all(asset['hash'] for asset in manifest)
+    assert artifact_key(site, cache_dir)[0] == key
+
+    # Like cp -p or rsync -a: new contents, same size, old mtime
+    stat = os.stat(str(media))
+    replacement = tmp_path / 'a.png.new'
+    replacement.write_bytes(b'other image')
+    os.utime(str(replacement), ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(str(replacement), str(media))
+    assert artifact_key(site, cache_dir)[0] != key
+
+def test_key_does_not_depend_on_mtimes(tmp_path):
+    site = tmp_path / 'site'
+    site.mkdir()
+    (site / 'index.html').write_text('<html></html>', encoding='utf-8')
+    (site / 'a.png').write_bytes(b'image')
+    key, _ = artifact_key(site, tmp_path / 'artifacts')
+    os.utime(str(site / 'a.png'), (1, 1))
+    assert artifact_key(site, tmp_path / 'artifacts')[0] == key
@@ -0,0 +1,10 @@
+import os
+
+from benchmarks.importtime import check_import_budget, default_budget_ms
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_import_stays_within_budget():
+    # Fails when importing html_to_exe loads a heavy module or takes longer
+    # than the budget; the printed report lists the slowest imports
+    assert check_import_budget(repo_dir, runs=3, budget_ms=default_budget_ms)
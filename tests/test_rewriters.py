@@ -0,0 +1,43 @@
+import pytest
+
+import html_to_exe
+
+# Pages the streaming rewriter has to handle like a real parser
+pages = {
+    'quoted': '<html><head><link rel="stylesheet" href="a.css"><script src="a.js"></script></head>'
+              '<body><p>text</p></body></html>',
+    'unquoted attributes': '<html><head><link rel=stylesheet href=css/a.css>'
+                           '<script src=js/a.js defer></script></head><body></body></html>',
+    'script text with a link': '<html><head><script>var tag = \'<link rel="stylesheet" href="x.css">\';</script>'
+                               '<script src="a.js"></script></head><body></body></html>',
+    'comments': '<html><head><!-- <link rel="stylesheet" href="old.css"> -->'
+                '<link rel="stylesheet" href="a.css"><!-- <script src="old.js"></script> --></head>'
+                '<body><!-- footer --></body></html>',
+    'self-closing links': '<html><head><link rel="stylesheet" href="a.css"/>'
+                          '<link rel="stylesheet" href="b.css" /></head><body></body></html>',
+    'uppercase tags': '<HTML><HEAD><LINK REL="stylesheet" HREF="a.css"><SCRIPT SRC="a.js"></SCRIPT></HEAD>'
+                      '<BODY><P>text</P></BODY></HTML>',
+    'other links and inline code': '<html><head><link rel="icon" href="icon.png">'
+                                   '<link rel="alternate stylesheet" href="alt.css"><style>p{}</style>'
+                                   '<script>var a = 1;</script></head><body></body></html>',
+}
+
+@pytest.mark.parametrize('name', sorted(pages))
+@pytest.mark.parametrize('backend', ['stream', 'bs4'])
+def test_backends_match_lxml(name, backend):
+    text = pages[name]
+    rewrite, _ = html_to_exe.html_rewriter(backend)
+    reference, _ = html_to_exe.html_rewriter('lxml')
+    assert html_to_exe.dom_signature(rewrite(text)) == html_to_exe.dom_signature(reference(text))
+
+@pytest.mark.parametrize('name', sorted(pages))
+def test_stream_rewrites_bundle_references(name):
+    # Guards against all backends agreeing on leaving the page unchanged
+    signature = html_to_exe.dom_signature(html_to_exe.rewrite_html_stream(pages[name]))
+    assert 'a.css' not in repr(signature)
+    assert 'a.js' not in repr(signature)
+
+def test_check_rewriters_on_a_site(tmp_path):
+    for name, text in pages.items():
+        (tmp_path / (name.replace(' ', '_') + '.html')).write_text(text, encoding='utf-8')
+    assert html_to_exe.check_rewriters(str(tmp_path)) == []
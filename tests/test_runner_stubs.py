@@ -0,0 +1,23 @@
+import os
+
+import html_to_exe
+
+def make_stub(toolchain_dir, name, size, mtime):
+    stub_dir = toolchain_dir / name
+    stub_dir.mkdir()
+    (stub_dir / 'runner').write_bytes(b'x' * size)
+    os.utime(str(stub_dir), (mtime, mtime))
+    return stub_dir
+
+def test_prune_runner_stubs_keeps_recent_and_current_stubs(tmp_path):
+    toolchain_dir = tmp_path / 'toolchain'
+    toolchain_dir.mkdir()
+    current = make_stub(toolchain_dir, 'stub-current', 100, 1000)
+    for i in range(4):
+        make_stub(toolchain_dir, f'stub-{i}', 100, 2000 + i)
+    (toolchain_dir / 'stub-killed.abc.tmp').mkdir()
+    os.utime(str(toolchain_dir / 'stub-killed.abc.tmp'), (1, 1))
+    (toolchain_dir / 'stub-building.def.tmp').mkdir()
+
+    html_to_exe.prune_runner_stubs(str(tmp_path), 250, str(current))
+    assert sorted(os.listdir(str(toolchain_dir))) == ['stub-3', 'stub-building.def.tmp', 'stub-current']
@@ -0,0 +1,30 @@
+import os
+
+import html_to_exe
+
+def make_site(root):
+    # A site with its own LICENSE and icon.ico next to the generated ones
+    site = root / 'site'
+    site.mkdir()
+    (site / 'index.html').write_text('<html><head></head><body>site</body></html>', encoding='utf-8')
+    (site / 'LICENSE').write_text('the site license', encoding='utf-8')
+    (site / 'icon.ico').write_bytes(b'site icon')
+    return site
+
+def test_prepare_leaves_linked_sources_alone(tmp_path):
+    site = make_site(tmp_path)
+    icon = tmp_path / 'converter.ico'
+    icon.write_bytes(b'converter icon')
+    config = html_to_exe.BuildConfig(str(site), str(tmp_path / 'out'), use_cache=False, workers=1,
+                                     icon_path=str(icon), staging_mode='link')
+    builder = html_to_exe.Builder(config)
+    builder.process_files()
+    icon_to_use, datas = builder.prepare()
+
+    assert (site / 'LICENSE').read_text(encoding='utf-8') == 'the site license'
+    assert (site / 'icon.ico').read_bytes() == b'site icon'
+    temp_dir = config.temp_dir
+    assert icon_to_use == str(icon)
+    assert open(os.path.join(temp_dir, 'icon.ico'), 'rb').read() == b'converter icon'
+    assert 'provided "as is"' in open(os.path.join(temp_dir, 'LICENSE'), encoding='utf-8').read()
+    assert {dest for dest, _, _ in datas} >= {'index.html', 'icon.ico', 'LICENSE'}
@@ -0,0 +1,24 @@
+import os
+
+import html_to_exe
+
+def test_watch_keeps_the_config_and_prunes_the_cache(tmp_path):
+    site = tmp_path / 'site'
+    site.mkdir()
+    (site / 'index.html').write_text('<html><head><link rel="stylesheet" href="a.css"></head></html>',
+                                     encoding='utf-8')
+    (site / 'a.css').write_text('p { color: red; }', encoding='utf-8')
+    (site / 'image.png').write_bytes(b'image')
+    cache_dir = tmp_path / 'cache'
+    config = html_to_exe.BuildConfig(str(site), str(tmp_path / 'out'), workers=1, staging_mode='direct',
+                                     cache_dir=str(cache_dir), cache_max_bytes=1)
+    watcher = html_to_exe.SiteWatcher(html_to_exe.Builder(config))
+    watcher.start()
+    assert config.staging_mode == 'direct'
+    assert os.path.exists(os.path.join(config.temp_dir, 'image.png'))
+
+    (site / 'a.css').write_text('p { color: blue; margin: 0; }', encoding='utf-8')
+    assert watcher.poll()
+    assert 'blue' in open(os.path.join(config.temp_dir, 'styles.min.css'), encoding='utf-8').read()
+    cache_files = [file for _, _, files in os.walk(str(cache_dir)) for file in files]
+    assert cache_files == []